@@ -0,0 +1,139 @@
+"""Планы горячих запросов к processing.chats/chat_links до и после индексов из 0003.
+
+Создает отдельную схему bench_processing в базе из настроек (DB__*), заполняет ее
+1M чатами и удаляет по завершении. Запускать на тестовой базе:
+
+    PYTHONPATH=src python benchmarks/chat_indexes.py [--chats 1000000]
+"""
+
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from db.migrations import VERSIONS_DIR, split_statements
+from settings import config
+
+SCHEMA = "bench_processing"
+
+# Запрос и то, что подставляется в $1: chat_id группы, chat_id канала или id группы
+QUERIES = {
+    "DBManager.get_chat(chat_id)": (
+        "group_chat_id",
+        f"""
+        SELECT c.id, c.chat_id, c.uid, c.type, c.title, c.creation_date, c.status,
+               coalesce(l.target_chat_id, NULL) AS target_chat_id
+        FROM {SCHEMA}.chats c
+        LEFT JOIN {SCHEMA}.chat_links l ON l.checked_chat_id = c.id
+        WHERE c.chat_id = $1
+        ORDER BY c.id
+    """,
+    ),
+    "DBManager.get_enforcement_context(chat_id)": (
+        "group_chat_id",
+        f"""
+        SELECT c.id, c.uid, c.chat_id, c.title, u.status, cc.id, cc.chat_id, cc.title,
+               cc.username, cc.invite_link
+        FROM {SCHEMA}.chats c
+        JOIN {SCHEMA}.users u ON u.id = c.uid
+        LEFT JOIN {SCHEMA}.chat_links l ON l.target_chat_id = c.id
+        LEFT JOIN {SCHEMA}.chats cc ON cc.id = l.checked_chat_id
+        WHERE c.type = 'group' AND c.chat_id = $1
+        ORDER BY c.id
+    """,
+    ),
+    "DBManager.get_chats(chat_id, type=channel)": (
+        "channel_chat_id",
+        f"""
+        SELECT * FROM {SCHEMA}.chats WHERE chat_id = $1 AND type = 'channel'
+    """,
+    ),
+    "DBManager.get_linked_chats(target_chat_id)": (
+        "group_id",
+        f"""
+        SELECT c.* FROM {SCHEMA}.chats c
+        LEFT JOIN {SCHEMA}.chat_links l ON c.id = l.checked_chat_id
+        WHERE l.target_chat_id = $1 AND l.target_chat_id IS NOT NULL
+    """,
+    ),
+}
+
+
+def migration_sql(name: str) -> str:
+    return (VERSIONS_DIR / name).read_text().replace("processing.", f"{SCHEMA}.")
+
+
+async def seed(conn: asyncpg.Connection, chats: int) -> None:
+    users = max(chats // 5, 1)
+
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    for name in ("0001_initial.sql", "0002_chats_username_invite_link.sql"):
+        for statement in split_statements(migration_sql(name)):
+            if not statement.startswith("CREATE SCHEMA"):
+                await conn.execute(statement)
+
+    await conn.execute(
+        f"INSERT INTO {SCHEMA}.users (chat_id, username, status) "
+        f"SELECT i, 'user' || i, true FROM generate_series(1, $1) i",
+        users,
+    )
+    # Нечетные id - группы, четные - каналы, каждая группа проверяет следующий за ней канал
+    await conn.execute(
+        f"INSERT INTO {SCHEMA}.chats (uid, chat_id, title, type) "
+        f"SELECT i % $2 + 1, -1000000000000 - i, 'chat ' || i, "
+        f"CASE WHEN i % 2 = 1 THEN 'group' ELSE 'channel' END "
+        f"FROM generate_series(1, $1) i",
+        chats,
+        users,
+    )
+    await conn.execute(
+        f"INSERT INTO {SCHEMA}.chat_links (target_chat_id, checked_chat_id) "
+        f"SELECT i, i + 1 FROM generate_series(1, $1 - 1, 2) i",
+        chats,
+    )
+    await conn.execute(f"ANALYZE {SCHEMA}.users, {SCHEMA}.chats, {SCHEMA}.chat_links")
+
+
+async def explain(conn: asyncpg.Connection, chats: int, title: str) -> None:
+    group_id = chats // 2 + 1
+    args = {
+        "group_id": group_id,
+        "group_chat_id": -1000000000000 - group_id,
+        "channel_chat_id": -1000000000000 - (group_id + 1),
+    }
+
+    print(f"\n===== {title} =====")
+    for name, (arg, query) in QUERIES.items():
+        rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", args[arg])
+        print(f"\n--- {name}")
+        for row in rows:
+            print(row[0])
+
+
+async def main(chats: int) -> None:
+    conn = await asyncpg.connect(config.db.dsn)
+    try:
+        started = time.monotonic()
+        await seed(conn, chats)
+        print(f"Seeded {chats} chats in {time.monotonic() - started:.1f}s")
+
+        await explain(conn, chats, "Before 0003_chat_indexes")
+
+        started = time.monotonic()
+        for statement in split_statements(migration_sql("0003_chat_indexes.sql")):
+            await conn.execute(statement)
+        await conn.execute(f"ANALYZE {SCHEMA}.chats, {SCHEMA}.chat_links")
+        print(f"\nIndexes built in {time.monotonic() - started:.1f}s")
+
+        await explain(conn, chats, "After 0003_chat_indexes")
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=1_000_000)
+    asyncio.run(main(parser.parse_args().chats))
@@ -0,0 +1,84 @@
+"""Стоимость разбора тела webhook до и после предварительного фильтра.
+
+Сравнивает полную валидацию Update из JSON (как было) с разбором JSON и проверкой
+нескольких полей (отброшенные апдейты) и с тем же путем для апдейтов, которые
+проходят фильтр. Снимок маршрутизации заполняется вручную, БД не нужна:
+
+    PYTHONPATH=src python benchmarks/webhook_prefilter.py [--iterations 20000]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable
+
+from aiogram.types import Update
+
+from bot.bot import bot
+from bot.services.ingress import json_loads, parse_update
+from bot.services.routing import routing_snapshot
+
+REGISTERED_CHAT_ID = -1001000000001
+UNREGISTERED_CHAT_ID = -1001000000002
+
+
+def make_body(chat_id: int) -> bytes:
+    return json.dumps(
+        {
+            "update_id": 100000001,
+            "message": {
+                "message_id": 4242,
+                "date": 1700000000,
+                "chat": {"id": chat_id, "type": "supergroup", "title": "Some group"},
+                "from": {
+                    "id": 123456789,
+                    "is_bot": False,
+                    "first_name": "Ivan",
+                    "last_name": "Ivanov",
+                    "username": "ivan",
+                    "language_code": "ru",
+                },
+                "text": "Привет всем, это обычное сообщение в группе " * 3,
+                "entities": [{"type": "bold", "offset": 0, "length": 6}],
+            },
+        }
+    ).encode()
+
+
+def measure(name: str, func: Callable[[], object], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations * 1_000_000
+    print(f"{name:<45} {per_call:8.1f} us")
+    return per_call
+
+
+def main(iterations: int) -> None:
+    routing_snapshot._pks_by_chat_id[REGISTERED_CHAT_ID].add(1)
+    routing_snapshot.ready = True
+
+    unregistered = make_body(UNREGISTERED_CHAT_ID)
+    registered = make_body(REGISTERED_CHAT_ID)
+    context = {"bot": bot}
+
+    print(f"json loads: {json_loads.__module__}, {iterations=}\n")
+    baseline = measure(
+        "Update.model_validate_json",
+        lambda: Update.model_validate_json(unregistered, context=context),
+        iterations,
+    )
+    dropped = measure(
+        "parse_update (unregistered, dropped)", lambda: parse_update(unregistered), iterations
+    )
+    passed = measure(
+        "parse_update (registered, validated)", lambda: parse_update(registered), iterations
+    )
+
+    print(f"\ndropped: x{baseline / dropped:.1f} faster, passed: x{baseline / passed:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20_000)
+    main(parser.parse_args().iterations)
@@ -17,17 +17,44 @@ fi
 
 export PYTHONPATH="$PYTHONPATH:/opt/apps/subcheckbot/src"
 
+run_migrations() {
+  echo "Applying DB migrations..."
+  poetry run python -m db.migrations
+}
+
 case "$1" in
+  migrate)
+    shift
+    run_migrations
+    ;;
   bot-webhook)
     shift
+    run_migrations
     echo "Starting bot WEBHOOK..."
     exec poetry run gunicorn bot.webhook_app:webhook_app --worker-class uvicorn.workers.UvicornWorker --bind $WEBHOOK_APP_HOST:$WEBHOOK_APP_PORT
     ;;
   bot-polling)
     shift
+    run_migrations
     echo "Starting bot POLLING..."
     exec poetry run python run_polling.py
     ;;
+  bot-consumer)
+    shift
+    run_migrations
+    echo "Starting bot CONSUMER..."
+    exec poetry run python run_consumer.py
+    ;;
+  migrate-user-status)
+    shift
+    echo "Migrating user statuses to the blocked users set..."
+    exec poetry run python migrate_user_status.py "$@"
+    ;;
+  bot-worker)
+    shift
+    echo "Starting celery WORKER..."
+    exec poetry run celery -A tasks worker --loglevel=INFO
+    ;;
   *)
     echo "Unknown service: $1"
     exec "$@"
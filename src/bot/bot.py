@@ -2,8 +2,10 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
-from db import create_tables
 from settings import config
+from .middlewares.dedup import UpdateDeduplicationMiddleware
+from .services.outbound import OutboundScheduler
+from .services.singleflight import SingleFlight
 
 import sentry_sdk
 import logging
@@ -13,10 +15,6 @@ import sys
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
 
-async def on_startup(bot: Bot) -> None:
-    await create_tables()
-
-
 if config.sentry.turned_on:
     sentry_sdk.init(
         dsn=config.sentry.dsn,
@@ -29,7 +27,19 @@ if config.sentry.turned_on:
 
 bot = Bot(config.telegram.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 
+# Первой подключенная мидлварь выполняется первой: объединенные запросы не занимают
+# место в очереди планировщика
+bot.session.middleware(SingleFlight())
+if config.outbound.turned_on:
+    bot.session.middleware(OutboundScheduler())
+
 dp = Dispatcher()
-dp.startup.register(on_startup)
+
+if config.dedup.turned_on:
+    dp.update.outer_middleware(UpdateDeduplicationMiddleware())
 
 from . import handlers  # noqa: E402, F401, F811
+from .services.background import start_background_tasks, stop_background_tasks  # noqa: E402
+
+dp.startup.register(start_background_tasks)
+dp.shutdown.register(stop_background_tasks)
@@ -6,6 +6,8 @@ from .channel_menu import channel_router
 from .chat_menu import chat_router
 from .start_menu import start_router
 from .group_messages_handler import group_router
+from .channel_members import channel_members_router
+from .group_members import group_members_router
 
 from ..bot import dp
 
@@ -13,6 +15,8 @@ main_router = Router()
 
 main_router.include_router(start_router)
 main_router.include_router(group_router)
+main_router.include_router(channel_members_router)
+main_router.include_router(group_members_router)
 main_router.include_router(channel_router)
 main_router.include_router(chat_router)
 main_router.include_router(admin_router)
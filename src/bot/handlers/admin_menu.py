@@ -1,3 +1,5 @@
+import html
+
 from aiogram import Router, F
 from aiogram.types import (
     Message,
@@ -17,9 +19,11 @@ from bot.schemas.callbacks.admin_menu import (
     UsersList,
 )
 from settings import config
-from db import Session, rd
+from db import Session
 from db.manager import DBManager
 from bot.middlewares.admin_auth import AdminAuthMiddleware
+from bot.services.users_count import get_users_count
+from bot.services.user_status import user_status_cache
 
 admin_router = Router()
 
@@ -40,77 +44,119 @@ async def admin_menu(message: Message) -> None:
     await message.answer(text="Администрироване", reply_markup=keyboard)
 
 
+def get_search_query(text: str | None) -> str:
+    """Начало имени пользователя из сообщения «Пользователи ivan»"""
+
+    query = (text or "").removeprefix("Пользователи").strip().lstrip("@")
+    # Двоеточие - разделитель callback data, а ее длина ограничена 64 байтами
+    return query.replace(":", "")[:12]
+
+
 @admin_router.message(F.text == "Пользователи")
+@admin_router.message(F.text.startswith("Пользователи "))
 @admin_router.callback_query(UsersList.filter())
 async def get_users_list(update: Message | CallbackQuery, callback_data: UsersList = None) -> None:
     if isinstance(update, Message):
         message = update
-        page_number = 1
+        callback_data = UsersList(query=get_search_query(update.text) or None)
     elif isinstance(update, CallbackQuery):
         message = utils.get_callback_message(update)
         if callback_data is None:
             raise ValueError("CallbackQuery must have callback_data")
-        page_number = callback_data.page_number
     else:
         raise TypeError(f"Unexpected update type: {type(update)}")
 
+    page_size = config.users_list.page_size
+    page_number = callback_data.page_number
+
     async with Session() as session:
         dbm = DBManager(session)
-        users, total_pages = await dbm.get_users(page_number=page_number)
-
-        message_text = "<code>Пользователи\n" "----------------\n"
-
-        buttons = []
-        row = []
+        # Лишний пользователь показывает, есть ли еще страница в направлении листания
+        users = await dbm.get_users_page(
+            after_id=callback_data.cursor,
+            before_id=callback_data.cursor if callback_data.backward else None,
+            limit=page_size + 1,
+            username_prefix=callback_data.query,
+        )
 
-        for i, user in enumerate(users):
-            order_num = (page_number - 1) * 10 + (i + 1)
-            message_text += f"{order_num}  {user.username:20} {'✅' if user.status else '❌'}\n"
-            row.append(
-                InlineKeyboardButton(
-                    text=str(order_num), callback_data=UserInfo(user_id=user.id).pack()
-                )
+    # Короткая обратная страница дополняется пользователями после курсора - это первая
+    # страница списка
+    if callback_data.backward and len(users) > page_size and users[-1].id < callback_data.cursor:
+        has_previous = True
+        has_next = True
+        users = users[-page_size:]
+    else:
+        if callback_data.backward:
+            page_number = 1
+        has_previous = page_number > 1
+        has_next = len(users) > page_size
+        users = users[:page_size]
+
+    if callback_data.query:
+        message_text = f"<code>Пользователи: {html.escape(callback_data.query)}*\n"
+    else:
+        message_text = f"<code>Пользователи (~{await get_users_count()})\n"
+    message_text += "----------------\n"
+
+    buttons = []
+    row = []
+
+    for i, user in enumerate(users):
+        order_num = (page_number - 1) * page_size + (i + 1)
+        message_text += f"{order_num}  {user.username:20} {'✅' if user.status else '❌'}\n"
+        row.append(
+            InlineKeyboardButton(
+                text=str(order_num), callback_data=UserInfo(user_id=user.id).pack()
             )
+        )
 
-            if len(row) == 5 or i == len(users) - 1:
-                buttons.append(row)
-                row = []
-
-        pagination_row = []
-
-        if page_number > 1:
-            pagination_row.append(
-                InlineKeyboardButton(
-                    text="<<<", callback_data=UsersList(page_number=page_number - 1).pack()
-                )
+        if len(row) == 5 or i == len(users) - 1:
+            buttons.append(row)
+            row = []
+
+    pagination_row = []
+
+    if has_previous and users:
+        pagination_row.append(
+            InlineKeyboardButton(
+                text="<<<",
+                callback_data=UsersList(
+                    page_number=page_number - 1,
+                    cursor=users[0].id,
+                    backward=True,
+                    query=callback_data.query,
+                ).pack(),
             )
-        if page_number < total_pages:
-            pagination_row.append(
-                InlineKeyboardButton(
-                    text=">>>", callback_data=UsersList(page_number=page_number + 1).pack()
-                )
+        )
+    if has_next and users:
+        pagination_row.append(
+            InlineKeyboardButton(
+                text=">>>",
+                callback_data=UsersList(
+                    page_number=page_number + 1, cursor=users[-1].id, query=callback_data.query
+                ).pack(),
             )
+        )
 
-        buttons.append(pagination_row)
+    buttons.append(pagination_row)
 
-        buttons.append(
-            [
-                InlineKeyboardButton(text="❌ Скрыть", callback_data="delete_message"),
-                InlineKeyboardButton(
-                    text="🔄 Обновить",
-                    callback_data=UsersList(page_number=page_number).pack(),
-                ),
-            ]
-        )
+    buttons.append(
+        [
+            InlineKeyboardButton(text="❌ Скрыть", callback_data="delete_message"),
+            InlineKeyboardButton(text="🔄 Обновить", callback_data=callback_data.pack()),
+        ]
+    )
 
-        try:
-            await message.delete()
-        except Exception:
-            pass
+    try:
+        await message.delete()
+    except Exception:
+        pass
 
-        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
 
-        message_text += "</code>"
+    message_text += "</code>"
+    if not callback_data.query:
+        message_text += "\nПоиск по имени: <code>Пользователи начало_имени</code>"
 
     await message.answer(text=message_text, reply_markup=keyboard)
 
@@ -168,18 +214,24 @@ async def get_user_info(callback: CallbackQuery, callback_data: UserInfo) -> Non
 
 @admin_router.callback_query(UserInfo.filter(F.parameter == UserInfoParameters.status))
 async def change_user_status(callback: CallbackQuery, callback_data: UserInfo) -> None:
+    status: bool | None = None
+
     async with Session() as session:
         async with session.begin():
             dbm = DBManager(session)
             user = await dbm.get_user(uid=callback_data.user_id)
-            rd_key = f"{config.redis.prefix}:{user.chat_id}"
 
             if callback_data.parameter == UserInfoParameters.status:
                 if callback_data.parameter_value == UserInfoParameterValue.on:
-                    user = await dbm.update_user(uid=user.id, status=True)
-                    await rd.hset(rd_key, "status", "True")
+                    status = True
                 elif callback_data.parameter_value == UserInfoParameterValue.off:
-                    user = await dbm.update_user(uid=user.id, status=False)
-                    await rd.hset(rd_key, "status", "False")
+                    status = False
+
+                if status is not None:
+                    user = await dbm.update_user(uid=user.id, status=status)
+
+    # Кэши обновляются только после коммита, чтобы не разойтись с БД
+    if status is not None:
+        await user_status_cache.set_status(user.chat_id, status)
 
     await send_user_info(utils.get_callback_message(callback), user=user, delete_message=True)
@@ -0,0 +1,51 @@
+from aiogram import Router, F
+from aiogram.types import ChatMemberUpdated
+
+from bot.services import membership, restrictions
+from bot.services.chat_sync import update_chat_health
+from db import Session
+from db.manager import DBManager
+
+from loguru import logger
+
+channel_members_router = Router()
+
+
+async def is_registered_channel(chat_id: int) -> bool:
+    async with Session() as session:
+        dbm = DBManager(session)
+        channels = await dbm.get_chats(chat_id=chat_id, chat_type="channel")
+
+    return bool(channels)
+
+
+@channel_members_router.chat_member(F.chat.type == "channel")
+async def channel_member_updated(event: ChatMemberUpdated) -> None:
+    if not await is_registered_channel(event.chat.id):
+        return
+
+    subscribed = membership.is_subscribed(event.new_chat_member.status)
+    await membership.track_membership(
+        chat_id=event.chat.id, user_id=event.new_chat_member.user.id, subscribed=subscribed
+    )
+
+    if subscribed:
+        await restrictions.lift_if_subscribed(event.new_chat_member.user.id)
+
+    logger.info(
+        f"Channel membership updated | {event.chat.id=} | "
+        f"user_id={event.new_chat_member.user.id} | {subscribed=}"
+    )
+
+
+@channel_members_router.my_chat_member(F.chat.type == "channel")
+async def bot_channel_status_updated(event: ChatMemberUpdated) -> None:
+    # Пока бот не был администратором канала, chat_member апдейты не приходили,
+    # поэтому накопленный индекс мог устареть
+    await membership.drop_index(event.chat.id)
+    await update_chat_health(event.chat.id, event.new_chat_member, chat_type="channel")
+
+    logger.info(
+        f"Bot status in channel changed | {event.chat.id=} | "
+        f"status={event.new_chat_member.status}"
+    )
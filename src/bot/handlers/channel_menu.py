@@ -8,7 +8,8 @@ from aiogram.types import (
 from aiogram.exceptions import TelegramBadRequest
 from aiogram import F
 
-from bot import bot, utils
+from bot import utils
+from bot.bot import bot
 from db import Session
 from db.manager import DBManager
 
@@ -40,7 +41,7 @@ async def send_channels_list(message: Message) -> None:
             buttons: list[list[InlineKeyboardButton]] = [[]]
 
             for i, channel in enumerate(channels):
-                message_text += f"{i+1:2}  {channel.title}\n"
+                message_text += f"{i+1:2}  {channel.title}{utils.health_mark(channel.health)}\n"
                 buttons[0].append(
                     InlineKeyboardButton(
                         text=str(i + 1),
@@ -94,6 +95,7 @@ async def send_channel_info(
                 "<code>Информация о канале/чате\n"
                 "-------------\n"
                 f"Название: {channel.title}\n"
+                f"Состояние: {utils.health_description(channel.health)}\n"
                 f"Привязан к чату: {chat_title}</code>"
             )
 
@@ -196,6 +198,8 @@ async def channel_shared(message: Message) -> None:
                     title=chat_info.title,
                     user_id=user.id,
                     chat_type="channel",
+                    username=chat_info.username,
+                    invite_link=chat_info.invite_link,
                 )
                 await session.commit()
             except IntegrityError:
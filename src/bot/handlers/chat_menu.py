@@ -7,14 +7,19 @@ from aiogram.types import (
 )
 from aiogram.exceptions import TelegramBadRequest
 
-from bot import bot, utils
+from bot import utils
+from bot.bot import bot
+from bot.services.unregistered import unregistered_groups
+from bot.services.chat_sync import check_chat_health
 from db import Session
 from db.manager import DBManager
 
 from sqlalchemy.exc import NoResultFound, IntegrityError
 
 from bot.schemas.callbacks.channel_menu import ChannelInfo
+from bot.schemas.general import ChatHealth, EnforcementMode
 from bot.schemas.callbacks.chat_menu import (
+    ChangeEnforcementMode,
     ChatsList,
     ChannelsListForPin,
     ChatInfo,
@@ -40,7 +45,7 @@ async def send_chats_list(message: Message) -> None:
             buttons: list[list[InlineKeyboardButton]] = [[]]
 
             for i, group in enumerate(groups):
-                message_text += f"{i+1:2}  {group.title}\n"
+                message_text += f"{i+1:2}  {group.title}{utils.health_mark(group.health)}\n"
                 buttons[0].append(
                     InlineKeyboardButton(
                         text=str(i + 1), callback_data=ChatInfo(group_id=group.id).pack()
@@ -76,10 +81,14 @@ async def send_chat_info(message: Message, group_id: int) -> None:
         async with session.begin():
             dbm = DBManager(session)
             chat_info = await dbm.get_chat(pk_id=group_id)
+            restrict_mode = chat_info.enforcement_mode == EnforcementMode.RESTRICT
             message_text = (
                 "<code>Информация о чате\n"
                 "-------------\n"
-                f"Название: {chat_info.title}\n\n"
+                f"Название: {chat_info.title}\n"
+                f"Состояние: {utils.health_description(chat_info.health)}\n"
+                f"Неподписчики: "
+                f"{'ограничиваются' if restrict_mode else 'сообщения удаляются'}\n\n"
                 f"----- Проверяемые каналы/чаты -----\n"
             )
 
@@ -88,7 +97,7 @@ async def send_chat_info(message: Message, group_id: int) -> None:
             buttons: list[list[InlineKeyboardButton]] = [[]]
 
             for i, channel in enumerate(channels):
-                message_text += f"{i+1:2}  {channel.title}\n"
+                message_text += f"{i+1:2}  {channel.title}{utils.health_mark(channel.health)}\n"
                 buttons[0].append(
                     InlineKeyboardButton(
                         text=str(i + 1),
@@ -110,6 +119,25 @@ async def send_chat_info(message: Message, group_id: int) -> None:
                     ),
                 ]
             )
+            buttons.append(
+                [
+                    InlineKeyboardButton(
+                        text=(
+                            "Удалять сообщения неподписчиков"
+                            if restrict_mode
+                            else "Ограничивать неподписчиков"
+                        ),
+                        callback_data=ChangeEnforcementMode(
+                            group_id=group_id,
+                            mode=(
+                                EnforcementMode.DELETE
+                                if restrict_mode
+                                else EnforcementMode.RESTRICT
+                            ),
+                        ).pack(),
+                    )
+                ]
+            )
             buttons.append(
                 [
                     InlineKeyboardButton(
@@ -141,9 +169,14 @@ async def get_channel_list_for_pin(
         async with session.begin():
             dbm = DBManager(session)
             user = await dbm.get_user(chat_id=callback.from_user.id)
-            channels = await dbm.get_unlinked_chats(
-                target_chat_id=callback_data.group_id, user_id=user.id
-            )
+            channels = [
+                channel
+                for channel in await dbm.get_unlinked_chats(
+                    target_chat_id=callback_data.group_id, user_id=user.id
+                )
+                # Подписку на недоступный боту канал проверить нельзя
+                if channel.health == ChatHealth.OK
+            ]
             message_text = (
                 "<code>Выберите канал/чат, который вы хотите закрепить за чатом\n"
                 "-------------\n"
@@ -202,6 +235,28 @@ async def pin_channel_to_chat(callback: CallbackQuery, callback_data: PinChannel
     await send_chat_info(utils.get_callback_message(callback), group_id=callback_data.group_id)
 
 
+@chat_router.callback_query(ChangeEnforcementMode.filter())
+async def change_enforcement_mode(
+    callback: CallbackQuery, callback_data: ChangeEnforcementMode
+) -> None:
+    async with Session() as session:
+        async with session.begin():
+            dbm = DBManager(session)
+            await dbm.set_enforcement_mode(
+                pk_id=callback_data.group_id, mode=callback_data.mode.value
+            )
+            chat = await dbm.get_chat(pk_id=callback_data.group_id)
+
+    # Режиму ограничения нужно право ограничивать участников
+    health = await check_chat_health(chat)
+    if health is not None and health != chat.health:
+        async with Session() as session:
+            async with session.begin():
+                await DBManager(session).set_chat_health(pk_id=chat.id, health=health.value)
+
+    await send_chat_info(utils.get_callback_message(callback), group_id=callback_data.group_id)
+
+
 @chat_router.callback_query(DeleteChat.filter())
 async def delete_chat_handler(callback: CallbackQuery, callback_data: DeleteChat) -> None:
     async with Session() as session:
@@ -235,12 +290,18 @@ async def chat_shared(message: Message) -> None:
             user = await dbm.get_user(chat_id=message.chat.id)
             try:
                 group = await dbm.add_chat(
-                    chat_id=chat_info.id, title=chat_info.title, user_id=user.id, chat_type="group"
+                    chat_id=chat_info.id,
+                    title=chat_info.title,
+                    user_id=user.id,
+                    chat_type="group",
+                    username=chat_info.username,
+                    invite_link=chat_info.invite_link,
                 )
                 await session.commit()
             except IntegrityError:
                 await message.answer(text="Чат уже был добавлен вами ранее")
                 return
+            await unregistered_groups.forget(chat_info.id)
             await send_chat_info(message, group_id=group.id)
 
             # await message.answer(text="Чат успешно добавлен")
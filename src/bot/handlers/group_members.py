@@ -0,0 +1,37 @@
+from aiogram import Router, F
+from aiogram.filters import ChatMemberUpdatedFilter, JOIN_TRANSITION
+from aiogram.types import ChatMemberUpdated
+from loguru import logger
+
+from bot.services.chat_sync import update_chat_health
+from bot.services.join_verification import join_verifier
+from bot.services.routing import get_group_route
+from settings import config
+
+group_members_router = Router()
+
+
+@group_members_router.chat_member(
+    F.chat.type == "supergroup", ChatMemberUpdatedFilter(JOIN_TRANSITION)
+)
+async def group_member_joined(event: ChatMemberUpdated) -> None:
+    user = event.new_chat_member.user
+    if user.is_bot or not config.join_verification.turned_on:
+        return
+
+    group = await get_group_route(event.chat.id)
+    if not group or not group.owner_status or not group.checked_chats:
+        return
+
+    # Проверка уходит в фон, чтобы не задерживать апдейты чата
+    join_verifier.add(chat_ids=[chat.chat_id for chat in group.checked_chats], user_id=user.id)
+
+
+@group_members_router.my_chat_member(F.chat.type == "supergroup")
+async def bot_group_status_updated(event: ChatMemberUpdated) -> None:
+    await update_chat_health(event.chat.id, event.new_chat_member, chat_type="group")
+
+    logger.info(
+        f"Bot status in group changed | {event.chat.id=} | "
+        f"status={event.new_chat_member.status}"
+    )
@@ -1,20 +1,105 @@
+from typing import Any
+
 from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.enums import ChatMemberStatus
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 from settings import config
 from bot.bot import bot
-from db import Session, rd
-from db.manager import DBManager
-
-from sqlalchemy.exc import NoResultFound
+from bot.schemas.general import ChatHealth, EnforcementMode
+from bot.services import breaker, cooldown, membership, restrictions
+from bot.services.albums import media_group_collector
+from bot.services.deletion import deletion_coalescer
+from bot.services.limiter import fan_out_limiter, gather_or_cancel
+from bot.services.outbound import OutboundDropped
+from bot.services.routing import CheckedChat, GroupRoute, get_group_route
+from db import rd
 
 from loguru import logger
 
 group_router = Router()
 
 
+class ChannelCheckFailed(Exception):
+    """Проверку подписки на канал выполнить не удалось, модерация сообщения пропускается"""
+
+
+async def check_channel(
+    chat: CheckedChat,
+    group_chat_id: int,
+    user_id: int,
+    subscribed: bool | None,
+    breaker_state: breaker.BreakerState,
+    data: dict[str, Any],
+) -> InlineKeyboardButton | None:
+    """Возвращает кнопку подписки на канал, если пользователь на него не подписан"""
+
+    if breaker_state == "open":
+        # Бот недавно потерял доступ к каналу, владелец группы уже уведомлен
+        raise ChannelCheckFailed
+
+    async with fan_out_limiter.slot(group_chat_id):
+        if subscribed is None:
+            try:
+                user_channel_status = await bot.get_chat_member(
+                    chat_id=chat.chat_id, user_id=user_id
+                )
+            except (TelegramBadRequest, TelegramForbiddenError):
+                logger.warning(
+                    f"Bot not found in channel | {chat.title} | {chat.chat_id} | {data=}"
+                )
+                await channel_unavailable(chat, data)
+                raise ChannelCheckFailed
+
+            subscribed = membership.is_subscribed(user_channel_status.status)
+            await membership.cache_membership(
+                chat_id=chat.chat_id, user_id=user_id, subscribed=subscribed
+            )
+
+        username, invite_link = chat.username, chat.invite_link
+
+        if not subscribed and not username and not invite_link:
+            # Данные канала еще не синхронизированы фоновым обновлением
+            try:
+                chat_obj = await bot.get_chat(chat_id=chat.chat_id)
+            except (TelegramBadRequest, TelegramForbiddenError):
+                logger.warning(
+                    f"Message sent to channel, where bot is not admin or kicked | "
+                    f"{chat.title=} | {chat.chat_id=}"
+                )
+                await channel_unavailable(chat, data)
+                raise ChannelCheckFailed
+
+            username, invite_link = chat_obj.username, chat_obj.invite_link
+
+    if breaker_state == "probe":
+        await breaker.record_success(chat.chat_id)
+
+    if subscribed:
+        return None
+
+    invite_url = f"https://t.me/{username}" if username else invite_link
+    return InlineKeyboardButton(text=f"Подписаться на {chat.title}", url=invite_url)
+
+
+def needs_api_call(chat: CheckedChat, subscribed: bool | None) -> bool:
+    """Нужен ли запрос в Bot API, чтобы проверить подписку на канал"""
+
+    return subscribed is None or (not subscribed and not chat.username and not chat.invite_link)
+
+
+async def channel_unavailable(chat: CheckedChat, data: dict[str, Any]) -> None:
+    """Учитывает ошибку доступа к каналу, а при размыкании предохранителя уведомляет владельца"""
+
+    if await breaker.record_failure(chat.chat_id):
+        await breaker.notify_owner(
+            chat_id=chat.chat_id,
+            owner_uid=data["owner_user_id"],
+            group_title=data["chat_title"],
+            channel_title=chat.title,
+        )
+
+
 @group_router.message(lambda message: message.chat.type == "supergroup")
 async def handler_group_message(message: Message) -> None:
     assert message.bot is not None
@@ -25,145 +110,168 @@ async def handler_group_message(message: Message) -> None:
     if message.from_user.username and message.from_user.username == "GroupAnonymousBot":
         return
 
-    async with Session() as session:
-        async with session.begin():
-            dbm = DBManager(session)
+    group = await get_group_route(message.chat.id)
+
+    if not group:
+        if config.debug:
+            logger.warning(f"Chat not found in DB | {message.chat.title=} | {message.chat.id=}")
+        return
+
+    if not group.owner_status:
+        return
+
+    if group.health != ChatHealth.OK:
+        # Без прав администратора бот не может удалять сообщения
+        return
+
+    if message.media_group_id:
+        # Альбом проверяется один раз, когда соберутся все его части
+        media_group_collector.add(message, lambda parts: moderate_messages(parts, group))
+        return
+
+    await moderate_messages([message], group)
+
+
+async def moderate_messages(messages: list[Message], group: GroupRoute) -> None:
+    """Проверяет подписки автора и удаляет сообщения (одно или части одного альбома)"""
+
+    message = messages[0]
+    assert message.bot is not None
+    assert message.from_user is not None
+
+    # Подписку на каналы, недоступные боту, проверить нельзя
+    checked_chats = [chat for chat in group.checked_chats if chat.health == ChatHealth.OK]
+
+    data = {
+        "id": group.id,
+        "owner_user_id": group.uid,
+        "chat_id": group.chat_id,
+        "chat_title": group.title,
+        "tg_username": message.from_user.username,
+        "tg_fullname": message.from_user.full_name,
+        "tg_user_id": message.from_user.id,
+        "messages": len(messages),
+    }
+
+    memberships = await membership.get_cached_memberships(
+        chat_ids=[chat.chat_id for chat in checked_chats],
+        user_id=message.from_user.id,
+    )
+
+    breaker_states = await breaker.get_states(
+        [chat.chat_id for chat in checked_chats if needs_api_call(chat, memberships[chat.chat_id])]
+    )
+
+    try:
+        results = await gather_or_cancel(
+            *(
+                check_channel(
+                    chat=chat,
+                    group_chat_id=message.chat.id,
+                    user_id=message.from_user.id,
+                    subscribed=memberships[chat.chat_id],
+                    breaker_state=breaker_states.get(chat.chat_id, "closed"),
+                    data=data,
+                )
+                for chat in checked_chats
+            )
+        )
+    except ChannelCheckFailed:
+        return
+
+    buttons = [[button] for button in results if button is not None]
+
+    if buttons:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+
+        if message.from_user.username:
+            mention = f"@{message.from_user.username}"
+        elif message.from_user.id and message.from_user.full_name:
+            mention = (
+                f'<a href="tg://user?id={message.from_user.id}">'
+                f"{message.from_user.full_name}"
+                f"</a>"
+            )
+        else:
+            raise ValueError("message.from_user.username or message.from_user.id not found")
+
+        if message.from_user.username and "channel_bot" in message.from_user.username.lower():
+            message_text = (
+                "В данный чат нельзя писать от имени канала. Переключитесь на "
+                "сообщения от своего лица, чтобы избежать удаления сообщения"
+            )
+        else:
+            # В режиме ограничения следующие сообщения неподписчика не придется удалять
+            restricted = group.enforcement_mode == EnforcementMode.RESTRICT and (
+                await restrictions.restrict_member(
+                    chat_id=message.chat.id, user_id=message.from_user.id
+                )
+            )
+
+            bot_info = await message.bot.get_me()
+            message_text = (
+                f"{mention} подпишитесь на каналы/чаты ниже, "
+                f"чтобы писать сообщения в этот чат\n\n"
+            )
+            if restricted:
+                message_text += "Возможность писать вернется сразу после подписки\n\n"
+            message_text += (
+                f"❔ Хотите проверять подписки в своем чате? "
+                f"Переходите в бот "
+                f'<a href="https://t.me/{bot_info.username}">{bot_info.first_name}</a>. '
+                f"Это просто и бесплатно 😉"
+            )
+
+        if await should_warn(message):
             try:
-                group = await dbm.get_chat(chat_id=message.chat.id)
-
-                if not group:
-                    if config.debug:
-                        logger.warning(
-                            f"Chat not found in DB | {message.chat.title=} | {message.chat.id=}"
-                        )
-                    return
-
-                checked_chats = await dbm.get_linked_chats(target_chat_id=group.id)
-                user = await dbm.get_user(uid=group.uid)
-            except NoResultFound:
+                warning = await message.answer(
+                    text=message_text,
+                    reply_markup=keyboard,
+                    parse_mode="HTML",
+                    disable_web_page_preview=True,
+                )
+            except TelegramBadRequest as ex:
+                await cooldown.release_warning(
+                    chat_id=message.chat.id, user_id=message.from_user.id
+                )
+                logger.error(f"Telegram error | {ex=} | chat_info={group}")
                 return
+            except OutboundDropped as ex:
+                # Группа исчерпала лимит сообщений, сами сообщения все равно удаляются
+                await cooldown.release_warning(
+                    chat_id=message.chat.id, user_id=message.from_user.id
+                )
+                logger.warning(f"Warning dropped | {ex=} | chat_id={message.chat.id}")
+            else:
+                await cooldown.remember_warning(
+                    chat_id=message.chat.id,
+                    user_id=message.from_user.id,
+                    message_id=warning.message_id,
+                )
 
-            if not user.status:
-                return
+        for part in messages:
+            deletion_coalescer.delete(chat_id=part.chat.id, message_id=part.message_id)
 
-            data = {
-                "id": group.id,
-                "owner_user_id": group.uid,
-                "chat_id": group.chat_id,
-                "chat_title": group.title,
-                "tg_username": message.from_user.username,
-                "tg_fullname": message.from_user.full_name,
-                "tg_user_id": message.from_user.id,
-            }
-
-            buttons = []
-
-            for chat in checked_chats:
-                try:
-                    chat_obj = await bot.get_chat(chat_id=chat.chat_id)
-                except (TelegramBadRequest, TelegramForbiddenError):
-                    logger.warning(
-                        f"Message sent to channel, where bot is not admin or kicked | "
-                        f"{chat.title=} | {chat.chat_id=}"
-                    )
-                    return
-
-                # TODO: Сделать проверку есть ли бот в канале,
-                # если нет, то писать создателю канала в бот, чтобы добавил его
-
-                try:
-                    user_channel_status = await bot.get_chat_member(
-                        chat_id=chat.chat_id, user_id=message.from_user.id
-                    )
-                except (TelegramBadRequest, TelegramForbiddenError):
-                    logger.warning(
-                        f"Bot not found in channel | {chat.title} | {chat.chat_id} | {data=}"
-                    )
-                    # Здесь отправка в celery
-                    return
-
-                if (
-                    user_channel_status.status != ChatMemberStatus.MEMBER
-                    and user_channel_status.status != ChatMemberStatus.CREATOR
-                    and user_channel_status.status != ChatMemberStatus.ADMINISTRATOR
-                ):
-                    invite_link = (
-                        f"https://t.me/{chat_obj.username}"
-                        if chat_obj.username
-                        else chat_obj.invite_link
-                    )
-                    buttons.append(
-                        [
-                            InlineKeyboardButton(
-                                text=f"Подписаться на {chat.title}",
-                                url=invite_link,
-                            )
-                        ]
-                    )
-
-            if buttons:
-                keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-                rd_key = f"subchecker:bot:mediagroup_id:{message.media_group_id}"
-
-                if message.from_user.username:
-                    mention = f"@{message.from_user.username}"
-                elif message.from_user.id and message.from_user.full_name:
-                    mention = (
-                        f'<a href="tg://user?id={message.from_user.id}">'
-                        f"{message.from_user.full_name}"
-                        f"</a>"
-                    )
-                else:
-                    raise ValueError(
-                        "message.from_user.username or message.from_user.id not found"
-                    )
-
-                if (
-                    message.from_user.username
-                    and "channel_bot" in message.from_user.username.lower()
-                ):
-                    message_text = (
-                        "В данный чат нельзя писать от имени канала. Переключитесь на "
-                        "сообщения от своего лица, чтобы избежать удаления сообщения"
-                    )
-                else:
-                    bot_info = await message.bot.get_me()
-                    message_text = (
-                        f"{mention} подпишитесь на каналы/чаты ниже, "
-                        f"чтобы писать сообщения в этот чат\n\n"
-                        f"❔ Хотите проверять подписки в своем чате? "
-                        f"Переходите в бот "
-                        f'<a href="https://t.me/{bot_info.username}">{bot_info.first_name}</a>. '
-                        f"Это просто и бесплатно 😉"
-                    )
-
-                try:
-                    if not message.media_group_id:
-                        await message.answer(
-                            text=message_text,
-                            reply_markup=keyboard,
-                            parse_mode="HTML",
-                            disable_web_page_preview=True,
-                        )
-                    elif not await rd.hget(rd_key, "123"):
-                        await rd.hset(rd_key, "123", "123")
-                        await rd.expire(rd_key, 10)
-
-                        await message.answer(
-                            text=message_text,
-                            reply_markup=keyboard,
-                            parse_mode="HTML",
-                            disable_web_page_preview=True,
-                        )
-                except TelegramBadRequest as ex:
-                    logger.error(f"Telegram error | {ex=} | chat_info={dict(group)}")
-                    return
-
-                try:
-                    await message.delete()
-                except Exception as ex:
-                    logger.error(f"Message to delete not found | ex={ex} | {message=}")
-
-                logger.warning(f"message restricted | {data=}")
-            else:
-                logger.success(f"message approved | {data=}")
+        logger.warning(f"message restricted | {data=}")
+    else:
+        logger.success(f"message approved | {data=}")
+
+
+async def should_warn(message: Message) -> bool:
+    """Нужно ли отправлять предупреждение на это сообщение.
+
+    Части одного альбома могут собраться в разных воркерах, предупреждение отправит
+    только тот, кто первым атомарно займет ключ альбома. Пока у пользователя висит
+    предыдущее предупреждение, новое не отправляется.
+    """
+
+    assert message.from_user is not None
+
+    if message.media_group_id:
+        rd_key = f"subchecker:bot:mediagroup_id:{message.chat.id}:{message.media_group_id}"
+        if not await rd.set(rd_key, "1", nx=True, ex=config.media_group.ttl):
+            return False
+
+    return bool(
+        await cooldown.claim_warning(chat_id=message.chat.id, user_id=message.from_user.id)
+    )
@@ -10,8 +10,8 @@ from aiogram.types import (
 )
 
 from bot.schemas.general import UserRoles
-from settings import config
-from db import Session, rd
+from bot.services.user_status import store_status
+from db import Session
 from db.manager import DBManager
 
 from loguru import logger
@@ -41,17 +41,11 @@ async def command_start_handler(message: Message) -> None:
                     status=True,
                 )
 
-            user_data = {
-                "id": user.id,
-                "username": user.username,
-                "status": str(user.status),
-            }
-
-            async with rd.lock(f"lock-{config.redis.prefix}:{message.chat.id}"):
-                rd_key = f"{config.redis.prefix}:{message.chat.id}"
-                await rd.hmset(rd_key, user_data)
+            await store_status(
+                message.chat.id, user.status, user_id=user.id, username=user.username
+            )
 
-            logger.info(f"Update user redis data | {user_data=} | {rd_key=}")
+            logger.info(f"Update user redis data | {user.id=} | {user.status=}")
 
             if not user.status:
                 await message.answer(
@@ -0,0 +1,126 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+membership_cache_requests = Counter(
+    "subcheckbot_membership_cache_requests_total",
+    "Обращения к кэшу подписок (result=index|hit|miss)",
+    ["result"],
+)
+
+db_pool_wait_seconds = Histogram(
+    "subcheckbot_db_pool_wait_seconds",
+    "Ожидание соединения из пула SQLAlchemy в обработчике сообщений групп, без его проверки",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+outbound_queue_depth = Gauge(
+    "subcheckbot_outbound_queue_depth",
+    "Запросы в Bot API, ожидающие своей очереди в планировщике",
+    ["priority"],
+)
+
+outbound_wait_seconds = Histogram(
+    "subcheckbot_outbound_wait_seconds",
+    "Время ожидания запроса в Bot API в планировщике",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+outbound_retry_after = Counter(
+    "subcheckbot_outbound_retry_after_total",
+    "Ответы TelegramRetryAfter на запросы в Bot API",
+    ["priority"],
+)
+
+outbound_dropped = Counter(
+    "subcheckbot_outbound_dropped_total",
+    "Сообщения в группы, не отправленные из-за исчерпанного лимита группы",
+    ["priority"],
+)
+
+deletion_batches = Counter(
+    "subcheckbot_deletion_batches_total",
+    "Вызовы deleteMessages из группировщика удалений",
+)
+
+deleted_messages = Counter(
+    "subcheckbot_deleted_messages_total",
+    "Сообщения, переданные на удаление группировщику удалений",
+)
+
+ingress_queue_depth = Gauge(
+    "subcheckbot_ingress_queue_depth",
+    "Апдейты webhook, принятые в очередь и еще не взятые воркерами",
+)
+
+ingress_wait_seconds = Histogram(
+    "subcheckbot_ingress_wait_seconds",
+    "Время от приема апдейта webhook до начала его обработки",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+bus_published = Counter(
+    "subcheckbot_bus_published_total",
+    "Апдейты, записанные в шину Redis Streams",
+)
+
+bus_processed = Counter(
+    "subcheckbot_bus_processed_total",
+    "Апдейты, обработанные консьюмером шины",
+)
+
+bus_dead_lettered = Counter(
+    "subcheckbot_bus_dead_lettered_total",
+    "Записи шины, перенесенные в dead stream после max_deliveries неудачных доставок",
+)
+
+bus_owned_partitions = Gauge(
+    "subcheckbot_bus_owned_partitions",
+    "Партиции шины, арендованные консьюмером",
+)
+
+updates = Counter(
+    "subcheckbot_updates_total",
+    "Полученные апдейты (result=new|duplicate_local|duplicate_redis)",
+    ["result"],
+)
+
+warnings = Counter(
+    "subcheckbot_warnings_total",
+    "Предупреждения о подписке (result=sent|suppressed - не отправлено, предыдущее еще в группе)",
+    ["result"],
+)
+
+join_verifications = Counter(
+    "subcheckbot_join_verifications_total",
+    "Проверки подписок новых участников групп (result=queued|dropped|verified)",
+    ["result"],
+)
+
+singleflight_coalesced = Counter(
+    "subcheckbot_singleflight_coalesced_total",
+    "Запросы в Bot API, которые дождались ответа такого же одновременного запроса",
+    ["method"],
+)
+
+ingress_dropped = Counter(
+    "subcheckbot_ingress_dropped_total",
+    "Апдейты webhook, отброшенные до полного разбора (reason=unregistered|anonymous_admin|no_sender)",
+    ["reason"],
+)
+
+unregistered_cache = Counter(
+    "subcheckbot_unregistered_cache_requests_total",
+    "Обращения к кэшу незарегистрированных групп (result=local|redis|miss)",
+    ["result"],
+)
+
+unregistered_left = Counter(
+    "subcheckbot_unregistered_left_total",
+    "Выходы бота из групп, которые так и не добавили в бота",
+)
+
+user_status_cache = Counter(
+    "subcheckbot_user_status_cache_requests_total",
+    "Проверки статуса пользователя в AuthMiddleware (result=local|redis|db)",
+    ["result"],
+)
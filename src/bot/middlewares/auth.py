@@ -4,8 +4,7 @@ from aiogram import types
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from settings import config
-from db import rd
+from bot.services.user_status import user_status_cache
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -25,10 +24,9 @@ class AuthMiddleware(BaseMiddleware):
         if message.text == "/start" or message.chat.type != "private":
             return await handler(event, data)
 
-        rd_key = f"{config.redis.prefix}:{message.chat.id}"
-        user_status = await rd.hget(rd_key, "status")
+        user_status = await user_status_cache.get(message.chat.id)
 
-        if user_status == b"False":
+        if user_status is False:
             await message.answer(
                 "Доступ к боту ограничен. За активацией обратитесь к @yocan_uc",
                 reply_markup=types.ReplyKeyboardRemove(),
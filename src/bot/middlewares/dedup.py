@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import types
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot import metrics
+from settings import config
+from db import rd
+
+PROCESSING = b"0"
+DONE = b"1"
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """Пропускает повторные доставки одного и того же апдейта.
+
+    Telegram повторяет апдейт, если webhook ответил не сразу, и повтор может попасть в
+    другой воркер. Уже виденные update_id сначала ищутся в памяти процесса, затем
+    атомарно отмечаются в Redis (SET NX) как обрабатываемые на dedup.processing_ttl
+    секунд, и только после успешной обработки отметка продлевается до dedup.ttl. Если
+    обработка упала или процесс был убит, повторная доставка обработает апдейт заново.
+    Записи шины, забранные у упавшего консьюмера (redelivered), обрабатываются, пока
+    апдейт не отмечен как обработанный.
+    """
+
+    def __init__(self) -> None:
+        self._seen: OrderedDict[int, None] = OrderedDict()
+
+    def _remember(self, update_id: int) -> None:
+        self._seen[update_id] = None
+        if len(self._seen) > config.dedup.lru_size:
+            self._seen.popitem(last=False)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, types.Update):
+            return await handler(event, data)
+
+        update_id = event.update_id
+        if update_id in self._seen:
+            metrics.updates.labels(result="duplicate_local").inc()
+            return None
+
+        rd_key = f"{config.dedup.prefix}:{update_id}"
+        try:
+            is_new = await rd.set(rd_key, PROCESSING, nx=True, ex=config.dedup.processing_ttl)
+            if not is_new and data.get("redelivered"):
+                # Прошлый владелец записи шины упал, не закончив обработку
+                is_new = await rd.get(rd_key) == PROCESSING
+        except RedisError:
+            # Без Redis лучше обработать апдейт повторно, чем потерять его
+            logger.warning(f"Update dedup is unavailable | {update_id=}")
+            is_new = True
+
+        if not is_new:
+            self._remember(update_id)
+            metrics.updates.labels(result="duplicate_redis").inc()
+            return None
+
+        metrics.updates.labels(result="new").inc()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            try:
+                await rd.delete(rd_key)
+            except RedisError:
+                pass
+            raise
+
+        self._remember(update_id)
+        try:
+            await rd.set(rd_key, DONE, ex=config.dedup.ttl)
+        except RedisError:
+            logger.warning(f"Update dedup is unavailable | {update_id=}")
+        return result
@@ -15,7 +15,13 @@ class UserInfoParameterValue(str, Enum):
 
 
 class UsersList(CallbackData, prefix="users_list"):
-    page_number: int
+    """Страница списка пользователей: cursor - id, от которого листать (вперед - после
+    него, backward - перед ним), query - начало имени пользователя для поиска"""
+
+    page_number: int = 1
+    cursor: int = 0
+    backward: bool = False
+    query: Optional[str] = None
 
 
 class UserInfo(CallbackData, prefix="user_info"):
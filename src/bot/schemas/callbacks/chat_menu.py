@@ -1,5 +1,7 @@
 from aiogram.filters.callback_data import CallbackData
 
+from bot.schemas.general import EnforcementMode
+
 
 class ChatsList(CallbackData, prefix="user_chats_list"): ...
 
@@ -19,3 +21,8 @@ class DeleteChat(CallbackData, prefix="delete_chat"):
 class PinChannelToChat(CallbackData, prefix="pin_channel_to_chat"):
     channel_id: int
     group_id: int
+
+
+class ChangeEnforcementMode(CallbackData, prefix="chat_enforcement_mode"):
+    group_id: int
+    mode: EnforcementMode
@@ -4,3 +4,18 @@ from enum import Enum
 class UserRoles(str, Enum):
     USER = "USER"
     ADMIN = "ADMIN"
+
+
+class EnforcementMode(str, Enum):
+    """Что делать с сообщениями неподписчиков в группе"""
+
+    DELETE = "delete"
+    RESTRICT = "restrict"
+
+
+class ChatHealth(str, Enum):
+    """Доступность чата для бота по результатам фоновой проверки"""
+
+    OK = "ok"
+    BOT_MISSING = "bot_missing"
+    NO_RIGHTS = "no_rights"
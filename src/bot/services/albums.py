@@ -0,0 +1,56 @@
+import asyncio
+import traceback
+from typing import Awaitable, Callable
+
+import sentry_sdk
+from aiogram.types import Message
+from loguru import logger
+
+from settings import config
+
+AlbumHandler = Callable[[list[Message]], Awaitable[None]]
+
+
+class MediaGroupCollector:
+    """Собирает части альбома (media group), чтобы обработать их одним вызовом.
+
+    Первая часть откладывает обработку на media_group.window секунд, остальные части,
+    пришедшие за это время, добавляются к ней. Обработчик апдейта при этом не ждет,
+    поэтому очередь апдейтов чата не блокируется.
+    """
+
+    def __init__(self) -> None:
+        self._albums: dict[tuple[int, str], list[Message]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def add(self, message: Message, handler: AlbumHandler) -> None:
+        assert message.media_group_id is not None
+
+        key = (message.chat.id, message.media_group_id)
+        parts = self._albums.get(key)
+        if parts is not None:
+            parts.append(message)
+            return
+
+        self._albums[key] = [message]
+        task = asyncio.create_task(self._handle_later(key, handler))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_later(self, key: tuple[int, str], handler: AlbumHandler) -> None:
+        await asyncio.sleep(config.media_group.window)
+
+        parts = self._albums.pop(key)
+        try:
+            await handler(sorted(parts, key=lambda part: part.message_id))
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"Media group handling failed | {key=} | {traceback.format_exc()}")
+
+    async def close(self) -> None:
+        """Дожидается обработки уже собираемых альбомов"""
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+media_group_collector = MediaGroupCollector()
@@ -0,0 +1,110 @@
+import asyncio
+import traceback
+import uuid
+from typing import Any, Awaitable, Callable, Coroutine
+
+import sentry_sdk
+from loguru import logger
+
+from db import rd
+from settings import config
+
+from .albums import media_group_collector
+from .chat_sync import sync_chats_info
+from .deletion import deletion_coalescer, run_scheduled_deletions
+from .join_verification import join_verifier
+from .routing import routing_snapshot
+from .unregistered import unregistered_groups
+from .users_count import refresh_users_count
+from .user_status import user_status_cache
+
+_tasks: set[asyncio.Task[None]] = set()
+
+
+def run_in_background(coro: Coroutine[Any, Any, None], name: str) -> None:
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+# Продлевает ключ задачи, только если он все еще принадлежит этому процессу
+_hold_lock = rd.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] and redis.call('pttl', KEYS[1]) < tonumber(ARGV[2]) "
+    "then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+LOCK_HOLD_SECONDS = 60
+
+
+async def _hold(lock_key: str, token: str) -> None:
+    while True:
+        await _hold_lock(keys=[lock_key], args=[token, LOCK_HOLD_SECONDS * 1000])
+        await asyncio.sleep(LOCK_HOLD_SECONDS / 3)
+
+
+async def run_periodically(job: Callable[[], Awaitable[None]], interval: int, name: str) -> None:
+    """Запускает job раз в interval секунд.
+
+    Воркеров может быть несколько (gunicorn), поэтому за каждый интервал задачу
+    выполняет только тот процесс, который первым занял ключ в Redis. Если задача
+    выполняется дольше интервала, ключ продлевается до ее завершения, чтобы другой
+    процесс не запустил ее параллельно.
+    """
+
+    lock_key = f"subchecker:bot:periodic:{name}"
+    token = uuid.uuid4().hex
+
+    while True:
+        try:
+            if await rd.set(lock_key, token, nx=True, ex=interval):
+                holder = asyncio.create_task(_hold(lock_key, token))
+                try:
+                    await job()
+                finally:
+                    holder.cancel()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"Periodic job failed | {name=} | {traceback.format_exc()}")
+
+        await asyncio.sleep(interval)
+
+
+async def start_background_tasks() -> None:
+    run_in_background(run_scheduled_deletions(), name="scheduled_deletions")
+
+    if config.join_verification.turned_on:
+        join_verifier.start()
+
+    if config.routing.turned_on:
+        run_in_background(routing_snapshot.run(), name="routing_snapshot")
+
+    if config.auth_cache.turned_on:
+        run_in_background(user_status_cache.run(), name="user_status_cache")
+    run_in_background(user_status_cache.warm_up(), name="user_status_warm_up")
+
+    run_in_background(
+        run_periodically(refresh_users_count, config.users_list.count_interval, "users_count"),
+        name="users_count",
+    )
+
+    if config.chat_sync.turned_on:
+        run_in_background(
+            run_periodically(sync_chats_info, config.chat_sync.interval, "chat_sync"),
+            name="chat_sync",
+        )
+
+
+async def stop_background_tasks() -> None:
+    await join_verifier.stop()
+
+    # Альбомы ставят сообщения на удаление, поэтому завершаются первыми
+    await media_group_collector.close()
+    await deletion_coalescer.close()
+    await unregistered_groups.close()
+
+    for task in _tasks:
+        task.cancel()
+
+    await asyncio.gather(*_tasks, return_exceptions=True)
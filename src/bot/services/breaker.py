@@ -0,0 +1,113 @@
+import asyncio
+from typing import Literal
+
+from loguru import logger
+
+from db import rd
+from settings import config
+from tasks.notifications import notify_channel_unavailable
+
+BreakerState = Literal["closed", "open", "probe"]
+
+
+def _key(kind: str, chat_id: int) -> str:
+    return f"{config.breaker.prefix}:{kind}:{chat_id}"
+
+
+async def get_states(chat_ids: list[int]) -> dict[int, BreakerState]:
+    """Состояния предохранителей каналов.
+
+    closed - канал доступен, open - бот недавно потерял доступ к каналу и запросы к
+    нему не выполняются, probe - пора проверить, вернули ли доступ (пробный запрос
+    разрешается только одному вызывающему).
+    """
+
+    if not chat_ids:
+        return {}
+
+    values = await rd.mget(
+        [key for chat_id in chat_ids for key in (_key("open", chat_id), _key("tripped", chat_id))]
+    )
+
+    states: dict[int, BreakerState] = {}
+    for number, chat_id in enumerate(chat_ids):
+        is_open, tripped = values[2 * number], values[2 * number + 1]
+
+        if is_open:
+            states[chat_id] = "open"
+        elif tripped:
+            probe = await rd.set(
+                _key("probe", chat_id), "1", nx=True, ex=config.breaker.probe_timeout
+            )
+            states[chat_id] = "probe" if probe else "open"
+        else:
+            states[chat_id] = "closed"
+
+    return states
+
+
+async def record_failure(chat_id: int) -> bool:
+    """Учитывает ошибку доступа к каналу, True - предохранитель разомкнут"""
+
+    failures_key, tripped_key = _key("failures", chat_id), _key("tripped", chat_id)
+
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.incr(failures_key)
+        pipe.expire(failures_key, config.breaker.failure_window)
+        pipe.exists(tripped_key)
+        failures, _, tripped = await pipe.execute()
+
+    if failures < config.breaker.failure_threshold and not tripped:
+        return False
+
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.set(_key("open", chat_id), "1", ex=config.breaker.open_timeout)
+        # Через tripped_ttl предохранитель сбрасывается полностью и владельцы получат
+        # повторное уведомление, если канал так и не починили
+        pipe.set(tripped_key, "1", ex=config.breaker.tripped_ttl, nx=True)
+        pipe.delete(failures_key, _key("probe", chat_id))
+        if not tripped:
+            # Уведомления прошлого срабатывания не должны глушить уведомления нового
+            pipe.delete(_key("notified", chat_id))
+        await pipe.execute()
+
+    if not tripped:
+        logger.warning(f"Channel circuit breaker opened | {chat_id=}")
+    return True
+
+
+async def record_success(chat_id: int) -> None:
+    """Пробный запрос прошел - канал снова доступен"""
+
+    await rd.delete(
+        _key("open", chat_id),
+        _key("tripped", chat_id),
+        _key("probe", chat_id),
+        _key("failures", chat_id),
+        _key("notified", chat_id),
+    )
+    logger.info(f"Channel circuit breaker closed | {chat_id=}")
+
+
+async def notify_owner(
+    chat_id: int, owner_uid: int, group_title: str | None, channel_title: str | None
+) -> None:
+    """Один раз за срабатывание предохранителя ставит в celery уведомление владельцу группы"""
+
+    # Множество уже уведомленных владельцев снимается вместе с предохранителем
+    notified_key = _key("notified", chat_id)
+    async with rd.pipeline(transaction=True) as pipe:
+        pipe.sadd(notified_key, owner_uid)
+        pipe.expire(notified_key, config.breaker.tripped_ttl)
+        added, _ = await pipe.execute()
+
+    if not added:
+        return
+
+    # Отправка в брокер синхронная, поэтому не в event loop
+    await asyncio.to_thread(
+        notify_channel_unavailable.delay,
+        owner_uid=owner_uid,
+        group_title=group_title,
+        channel_title=channel_title,
+    )
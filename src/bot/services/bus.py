@@ -0,0 +1,273 @@
+import asyncio
+import math
+import random
+import time
+import traceback
+
+import sentry_sdk
+from aiogram.types import Update
+from loguru import logger
+from redis.exceptions import ResponseError
+
+from bot import metrics
+from bot.bot import bot, dp
+from db import rd
+from settings import config
+
+from .ingress import feed_update, get_partition
+
+# Продлевает/снимает аренду партиции, только если она все еще принадлежит этому консьюмеру
+_renew_lease = rd.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+)
+_release_lease = rd.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+def _stream_key(partition: int) -> str:
+    return f"{config.bus.prefix}:stream:{partition}"
+
+
+def _lease_key(partition: int) -> str:
+    return f"{config.bus.prefix}:lease:{partition}"
+
+
+def _dead_key() -> str:
+    return f"{config.bus.prefix}:dead"
+
+
+def _consumers_key() -> str:
+    return f"{config.bus.prefix}:consumers"
+
+
+async def publish(update: Update) -> None:
+    """Кладет апдейт в stream его партиции"""
+
+    partition = get_partition(update, config.bus.partitions)
+    await rd.xadd(
+        _stream_key(partition),
+        {"update": update.model_dump_json(by_alias=True, exclude_unset=True)},
+        maxlen=config.bus.maxlen,
+        approximate=True,
+    )
+    metrics.bus_published.inc()
+
+
+async def poll_to_bus() -> None:
+    """Long polling, который не обрабатывает апдейты, а только кладет их в шину.
+
+    offset сдвигается после записи в Redis, поэтому при сбое апдейты не теряются.
+    """
+
+    offset: int | None = None
+    allowed_updates = dp.resolve_used_update_types()
+
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=30, allowed_updates=allowed_updates
+            )
+            for update in updates:
+                await publish(update)
+                offset = update.update_id + 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"Polling to bus failed | {traceback.format_exc()}")
+            await asyncio.sleep(config.bus.block)
+
+
+class BusConsumer:
+    """Обработчик апдейтов из шины Redis Streams.
+
+    Консьюмеров может быть сколько угодно на любом числе машин. Каждая партиция в
+    каждый момент арендована одним консьюмером (ключ аренды в Redis), поэтому апдейты
+    одного чата обрабатываются строго по порядку. Партиции делятся поровну между
+    живыми консьюмерами. Аренда упавшего консьюмера истекает через lease_ttl, и новый
+    владелец сначала забирает себе и обрабатывает неподтвержденные им записи.
+
+    Если обработка записи упала, партиция перечитывает неподтвержденные записи с начала.
+    Запись, доставленная больше max_deliveries раз, переносится в dead stream и
+    подтверждается, чтобы не останавливать партицию.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._owned: dict[int, asyncio.Task[None]] = {}
+        self._releasing: set[int] = set()
+
+    async def run(self) -> None:
+        await self._create_groups()
+        logger.info(f"Bus consumer started | name={self.name}")
+
+        try:
+            while True:
+                try:
+                    await self._rebalance()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    sentry_sdk.capture_exception(ex)
+                    logger.error(f"Bus rebalance failed | {traceback.format_exc()}")
+
+                await asyncio.sleep(config.bus.lease_ttl / 3)
+        finally:
+            for task in self._owned.values():
+                task.cancel()
+            await asyncio.gather(*self._owned.values(), return_exceptions=True)
+
+            for partition in self._owned:
+                await _release_lease(keys=[_lease_key(partition)], args=[self.name])
+            await rd.zrem(_consumers_key(), self.name)
+            metrics.bus_owned_partitions.set(0)
+
+    async def _create_groups(self) -> None:
+        for partition in range(config.bus.partitions):
+            try:
+                await rd.xgroup_create(
+                    _stream_key(partition), config.bus.group, id="0", mkstream=True
+                )
+            except ResponseError as ex:
+                if "BUSYGROUP" not in str(ex):
+                    raise
+
+    async def _rebalance(self) -> None:
+        lease_ms = config.bus.lease_ttl * 1000
+
+        for partition, task in list(self._owned.items()):
+            renewed = await _renew_lease(keys=[_lease_key(partition)], args=[self.name, lease_ms])
+            if not renewed or task.done():
+                # Аренду забрали (например, процесс надолго зависал) - партицией владеет другой
+                logger.warning(f"Bus partition lease lost | {partition=}")
+                task.cancel()
+                del self._owned[partition]
+
+        now = time.time()
+        await rd.zadd(_consumers_key(), {self.name: now})
+        await rd.zremrangebyscore(_consumers_key(), 0, now - config.bus.lease_ttl)
+        consumers = max(1, await rd.zcard(_consumers_key()))
+        share = math.ceil(config.bus.partitions / consumers)
+
+        while len(self._owned) > share:
+            await self._release(next(iter(self._owned)))
+
+        # Начинаем со случайной партиции, чтобы консьюмеры не конкурировали за одни и те же
+        offset = random.randrange(config.bus.partitions)
+        for step in range(config.bus.partitions):
+            if len(self._owned) >= share:
+                break
+
+            partition = (offset + step) % config.bus.partitions
+            if partition in self._owned:
+                continue
+
+            if await rd.set(_lease_key(partition), self.name, nx=True, px=lease_ms):
+                self._owned[partition] = asyncio.create_task(
+                    self._consume(partition), name=f"bus_partition_{partition}"
+                )
+
+        metrics.bus_owned_partitions.set(len(self._owned))
+
+    async def _release(self, partition: int) -> None:
+        """Отдает партицию, дождавшись обработки уже прочитанных записей"""
+
+        task = self._owned.pop(partition)
+        self._releasing.add(partition)
+        try:
+            await asyncio.gather(task, return_exceptions=True)
+        finally:
+            self._releasing.discard(partition)
+        await _release_lease(keys=[_lease_key(partition)], args=[self.name])
+
+    async def _consume(self, partition: int) -> None:
+        key = _stream_key(partition)
+
+        # Сначала записи, которые прочитал, но не подтвердил прошлый владелец партиции
+        await self._claim_pending(key)
+        last_id = "0"
+
+        while partition not in self._releasing:
+            try:
+                response = await rd.xreadgroup(
+                    config.bus.group,
+                    self.name,
+                    {key: last_id},
+                    # Каждое чтение истории увеличивает счетчик доставок всех прочитанных
+                    # записей, поэтому неподтвержденные читаются по одной
+                    count=config.bus.batch_size if last_id == ">" else 1,
+                    block=config.bus.block * 1000,
+                )
+                entries = response[0][1] if response else []
+
+                if last_id != ">" and not entries:
+                    # Неподтвержденные записи закончились, дальше только новые
+                    last_id = ">"
+                    continue
+
+                for entry_id, fields in entries:
+                    redelivered = last_id != ">"
+                    if redelivered:
+                        last_id = entry_id
+                        if await self._dead_letter(key, partition, entry_id, fields):
+                            continue
+
+                    await self._handle(fields, redelivered=redelivered)
+                    await rd.xack(key, config.bus.group, entry_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                sentry_sdk.capture_exception(ex)
+                logger.error(f"Bus partition failed | {partition=} | {traceback.format_exc()}")
+                # Упавшая запись и следующие за ней остались неподтвержденными
+                last_id = "0"
+                await asyncio.sleep(config.bus.block)
+
+    async def _dead_letter(
+        self, key: str, partition: int, entry_id: bytes, fields: dict[bytes, bytes]
+    ) -> bool:
+        """Переносит запись в dead stream, если ее доставляли больше max_deliveries раз"""
+
+        pending = await rd.xpending_range(
+            key, config.bus.group, min=entry_id, max=entry_id, count=1
+        )
+        if not pending or pending[0]["times_delivered"] <= config.bus.max_deliveries:
+            return False
+
+        async with rd.pipeline(transaction=True) as pipe:
+            pipe.xadd(
+                _dead_key(),
+                {**fields, b"partition": partition, b"entry_id": entry_id},
+                maxlen=config.bus.maxlen,
+                approximate=True,
+            )
+            pipe.xack(key, config.bus.group, entry_id)
+            await pipe.execute()
+
+        metrics.bus_dead_lettered.inc()
+        logger.error(
+            f"Bus entry dead-lettered | {partition=} | entry_id={entry_id!r} | "
+            f"deliveries={pending[0]['times_delivered']}"
+        )
+        return True
+
+    async def _claim_pending(self, key: str) -> None:
+        start_id = "0-0"
+        while True:
+            # Ответ без justid, потому что с ним redis-py не возвращает курсор
+            result = await rd.xautoclaim(
+                key, config.bus.group, self.name, min_idle_time=0, start_id=start_id, count=100
+            )
+            start_id = result[0]
+            if start_id in (b"0-0", "0-0"):
+                return
+
+    @staticmethod
+    async def _handle(fields: dict[bytes, bytes], redelivered: bool) -> None:
+        update = Update.model_validate_json(fields[b"update"], context={"bot": bot})
+        # Ошибка обработчика оставляет запись неподтвержденной до повтора или dead stream
+        await feed_update(update, redelivered=redelivered)
+        metrics.bus_processed.inc()
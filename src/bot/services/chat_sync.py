@@ -0,0 +1,178 @@
+import asyncio
+
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import (
+    ChatMemberAdministrator,
+    ChatMemberBanned,
+    ChatMemberLeft,
+    ChatMemberMember,
+    ChatMemberOwner,
+    ChatMemberRestricted,
+)
+from loguru import logger
+
+from bot.bot import bot
+from bot.schemas.general import ChatHealth, EnforcementMode
+from bot.services.outbound import Priority, outbound_priority
+from db import Session, rd
+from db.manager import DBManager
+from db.models import Chat
+from settings import config
+
+AnyChatMember = (
+    ChatMemberOwner
+    | ChatMemberAdministrator
+    | ChatMemberMember
+    | ChatMemberRestricted
+    | ChatMemberLeft
+    | ChatMemberBanned
+)
+
+# Доля интервала, на которую растягивается обход, чтобы он успел закончиться до следующего
+SWEEP_INTERVAL_SHARE = 0.8
+
+SWEEP_CURSOR_KEY = "subchecker:bot:chat_sync:cursor"
+
+# Ответы getChatMember, которые значат, что бота в чате нет. Остальные ошибки могут быть
+# временными и не меняют сохраненную доступность чата
+BOT_MISSING_ERRORS = ("chat not found", "bot was kicked", "bot is not a member")
+
+
+def get_member_health(
+    member: AnyChatMember, chat_type: str, enforcement_mode: str = EnforcementMode.DELETE
+) -> ChatHealth:
+    """Хватает ли боту прав в чате (member - сам бот)"""
+
+    if member.status == ChatMemberStatus.CREATOR:
+        return ChatHealth.OK
+    if member.status in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED):
+        return ChatHealth.BOT_MISSING
+    if not isinstance(member, ChatMemberAdministrator):
+        return ChatHealth.NO_RIGHTS
+    if chat_type == "group" and not member.can_delete_messages:
+        return ChatHealth.NO_RIGHTS
+    if (
+        chat_type == "group"
+        and enforcement_mode == EnforcementMode.RESTRICT
+        and not member.can_restrict_members
+    ):
+        return ChatHealth.NO_RIGHTS
+    return ChatHealth.OK
+
+
+async def check_chat_health(chat: Chat) -> ChatHealth | None:
+    """Есть ли бот в чате и хватает ли ему прав (getChatMember самого бота).
+
+    None - проверить не удалось, доступность чата не меняется.
+    """
+
+    try:
+        member = await bot.get_chat_member(chat_id=chat.chat_id, user_id=bot.id)
+    except TelegramForbiddenError:
+        return ChatHealth.BOT_MISSING
+    except TelegramBadRequest as ex:
+        if any(error in ex.message.lower() for error in BOT_MISSING_ERRORS):
+            return ChatHealth.BOT_MISSING
+        logger.warning(f"Chat health not checked | {chat.id=} | {chat.chat_id=} | {ex=}")
+        return None
+
+    return get_member_health(member, chat.type, chat.enforcement_mode)
+
+
+async def update_chat_health(chat_id: int, member: AnyChatMember, chat_type: str) -> None:
+    """Сохраняет доступность чата сразу после изменения прав бота, не дожидаясь обхода"""
+
+    async with Session() as session:
+        async with session.begin():
+            dbm = DBManager(session)
+            # Один чат могут добавить несколько пользователей, у каждого свой режим
+            for chat in await dbm.get_chats(chat_id=chat_id):
+                health = get_member_health(member, chat_type, chat.enforcement_mode)
+                if chat.health != health:
+                    await dbm.set_chat_health(pk_id=chat.id, health=health.value)
+
+
+async def sync_chats_info() -> None:
+    """Проверяет доступность всех чатов для бота и перечитывает их данные из Bot API.
+
+    Чаты обходятся пачками по id. На каждый чат уходит getChatMember бота и, если чат
+    доступен, getChat для названия, username и ссылки-приглашения. Запросы идут с
+    фоновым приоритетом и равномерно растянуты на интервал (но не чаще chat_sync.rate
+    в секунду), чтобы не конкурировать с модерацией сообщений за лимиты Telegram.
+    """
+
+    async with Session() as session:
+        chats_count = await DBManager(session).count_chats()
+
+    # Два запроса на чат
+    delay = max(
+        2 / config.chat_sync.rate,
+        config.chat_sync.interval * SWEEP_INTERVAL_SHARE / max(chats_count, 1),
+    )
+    if chats_count * delay > config.chat_sync.interval:
+        logger.warning(
+            f"Chats sweep is longer than its interval | {chats_count=} | "
+            f"seconds={chats_count * delay:.0f} | interval={config.chat_sync.interval}"
+        )
+
+    # Обход, прерванный перезапуском процесса, продолжается с того же места
+    cursor = await rd.get(SWEEP_CURSOR_KEY)
+    after_id = int(cursor) if cursor else 0
+    updated = 0
+    broken = 0
+
+    while True:
+        async with Session() as session:
+            dbm = DBManager(session)
+            chats = await dbm.get_chats_page(after_id=after_id, limit=config.chat_sync.batch_size)
+
+        if not chats:
+            break
+
+        info_changes = []
+        health_changes = []
+
+        for chat in chats:
+            with outbound_priority(Priority.BACKGROUND):
+                health = await check_chat_health(chat) or ChatHealth(chat.health)
+
+                chat_info = None
+                if health != ChatHealth.BOT_MISSING:
+                    try:
+                        chat_info = await bot.get_chat(chat_id=chat.chat_id)
+                    except (TelegramBadRequest, TelegramForbiddenError) as ex:
+                        logger.warning(
+                            f"Chat info not synced | {chat.id=} | {chat.chat_id=} | {ex=}"
+                        )
+
+            if health != chat.health:
+                logger.warning(f"Chat health changed | {chat.id=} | {chat.chat_id=} | {health=}")
+                health_changes.append((chat.id, health))
+            if health != ChatHealth.OK:
+                broken += 1
+
+            if chat_info is not None:
+                info = (chat_info.title, chat_info.username, chat_info.invite_link)
+                if info != (chat.title, chat.username, chat.invite_link):
+                    info_changes.append((chat.id, info))
+
+            await asyncio.sleep(delay)
+
+        if info_changes or health_changes:
+            async with Session() as session:
+                async with session.begin():
+                    dbm = DBManager(session)
+                    for pk_id, (title, username, invite_link) in info_changes:
+                        await dbm.update_chat_info(
+                            pk_id=pk_id, title=title, username=username, invite_link=invite_link
+                        )
+                    for pk_id, health in health_changes:
+                        await dbm.set_chat_health(pk_id=pk_id, health=health.value)
+            updated += len(info_changes)
+
+        after_id = chats[-1].id
+        await rd.set(SWEEP_CURSOR_KEY, after_id, ex=config.chat_sync.interval * 2)
+
+    await rd.delete(SWEEP_CURSOR_KEY)
+    logger.info(f"Chats info synced | {updated=} | {broken=}")
@@ -0,0 +1,49 @@
+from bot import metrics
+from db import rd
+from settings import config
+
+from .deletion import schedule_deletion
+
+
+def _warning_key(chat_id: int, user_id: int) -> str:
+    return f"{config.warnings.prefix}:{chat_id}:{user_id}"
+
+
+def _warning_ttl() -> int:
+    """Кулдаун не короче жизни предупреждения, иначе новое придет, пока видно старое"""
+
+    ttl: int = max(config.warnings.cooldown, config.warnings.lifetime)
+    return ttl
+
+
+async def claim_warning(chat_id: int, user_id: int) -> bool:
+    """Занимает право отправить пользователю предупреждение в группе.
+
+    False - предупреждение этому пользователю уже висит в группе (или его отправляет
+    другой воркер), и новое не отправляется до конца warnings.cooldown, а если
+    предупреждение удаляется позже, то пока оно не удалено.
+    """
+
+    claimed = bool(await rd.set(_warning_key(chat_id, user_id), "1", nx=True, ex=_warning_ttl()))
+    if not claimed:
+        metrics.warnings.labels(result="suppressed").inc()
+    return claimed
+
+
+async def release_warning(chat_id: int, user_id: int) -> None:
+    """Снимает кулдаун, если предупреждение отправить не удалось"""
+
+    await rd.delete(_warning_key(chat_id, user_id))
+
+
+async def remember_warning(chat_id: int, user_id: int, message_id: int) -> None:
+    """Отсчитывает кулдаун с момента отправки предупреждения и планирует его удаление"""
+
+    metrics.warnings.labels(result="sent").inc()
+    # Отправка могла ждать в очереди исходящих запросов, кулдаун продлевается
+    await rd.expire(_warning_key(chat_id, user_id), _warning_ttl())
+
+    if config.warnings.lifetime:
+        await schedule_deletion(
+            chat_id=chat_id, message_id=message_id, delay=config.warnings.lifetime
+        )
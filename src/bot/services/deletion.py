@@ -0,0 +1,156 @@
+import asyncio
+import time
+import traceback
+from typing import Any, Coroutine
+
+import sentry_sdk
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot import metrics
+from bot.bot import bot
+from db import rd
+from settings import config
+
+# Максимум id в одном вызове deleteMessages
+MAX_BATCH_SIZE = 100
+
+# Отложенные удаления: member "chat_id:message_id", score - время удаления
+SCHEDULE_KEY = "subchecker:bot:delayed_deletions"
+
+# Атомарно забирает наступившие удаления, поэтому воркеров может быть сколько угодно
+_pop_due = rd.register_script(
+    "local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2]) "
+    "if #due > 0 then redis.call('zrem', KEYS[1], unpack(due)) end "
+    "return due"
+)
+
+
+class DeletionCoalescer:
+    """Копит id сообщений на удаление по чатам и удаляет их пачками через deleteMessages.
+
+    Пачка отправляется через deletion.window секунд после первого сообщения или сразу,
+    как только набралось 100 id. Если пачку удалить не удалось, сообщения удаляются
+    по одному. При флуд-контроле (планировщик исходящих запросов уже исчерпал повторы)
+    оставшиеся сообщения откладываются на retry_after через отложенные удаления.
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[int, list[int]] = {}
+        self._flushers: dict[int, asyncio.Task[None]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def delete(self, chat_id: int, message_id: int) -> None:
+        batch = self._pending.setdefault(chat_id, [])
+        batch.append(message_id)
+
+        if len(batch) >= MAX_BATCH_SIZE:
+            self._pending.pop(chat_id)
+            flusher = self._flushers.pop(chat_id, None)
+            if flusher:
+                flusher.cancel()
+            self._spawn(self._delete(chat_id, batch))
+        elif chat_id not in self._flushers:
+            self._flushers[chat_id] = self._spawn(self._flush_later(chat_id))
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> asyncio.Task[None]:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, chat_id: int) -> None:
+        await asyncio.sleep(config.deletion.window)
+
+        self._flushers.pop(chat_id, None)
+        batch = self._pending.pop(chat_id, [])
+        if batch:
+            await self._delete(chat_id, batch)
+
+    async def _delete(self, chat_id: int, message_ids: list[int]) -> None:
+        metrics.deletion_batches.inc()
+        metrics.deleted_messages.inc(len(message_ids))
+
+        try:
+            await bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+            return
+        except TelegramRetryAfter as ex:
+            await self._delete_later(chat_id, message_ids, ex.retry_after)
+            return
+        except TelegramAPIError as ex:
+            logger.warning(f"Batch delete failed | {chat_id=} | {message_ids=} | {ex=}")
+
+        for number, message_id in enumerate(message_ids):
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+            except TelegramRetryAfter as ex:
+                await self._delete_later(chat_id, message_ids[number:], ex.retry_after)
+                return
+            except TelegramAPIError as ex:
+                logger.error(f"Message to delete not found | {chat_id=} | {message_id=} | {ex=}")
+
+    async def _delete_later(self, chat_id: int, message_ids: list[int], retry_after: int) -> None:
+        logger.warning(
+            f"Delete postponed by flood control | {chat_id=} | {message_ids=} | {retry_after=}"
+        )
+        deadline = time.time() + retry_after
+        try:
+            await rd.zadd(
+                SCHEDULE_KEY, {f"{chat_id}:{message_id}": deadline for message_id in message_ids}
+            )
+            return
+        except RedisError as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"Delete not scheduled | {chat_id=} | {traceback.format_exc()}")
+
+        # Без Redis повтор живет только в памяти процесса
+        self._spawn(self._retry_later(chat_id, message_ids, retry_after))
+
+    async def _retry_later(self, chat_id: int, message_ids: list[int], delay: float) -> None:
+        await asyncio.sleep(delay)
+        for message_id in message_ids:
+            self.delete(chat_id=chat_id, message_id=message_id)
+
+    async def close(self) -> None:
+        """Удаляет все накопленные сообщения, не дожидаясь окончания окна"""
+
+        for flusher in self._flushers.values():
+            flusher.cancel()
+        self._flushers.clear()
+
+        pending, self._pending = self._pending, {}
+        await asyncio.gather(
+            *self._tasks,
+            *(self._delete(chat_id, batch) for chat_id, batch in pending.items()),
+            return_exceptions=True,
+        )
+
+
+deletion_coalescer = DeletionCoalescer()
+
+
+async def schedule_deletion(chat_id: int, message_id: int, delay: float) -> None:
+    """Удаляет сообщение через delay секунд (переживает перезапуск бота)"""
+
+    await rd.zadd(SCHEDULE_KEY, {f"{chat_id}:{message_id}": time.time() + delay})
+
+
+async def run_scheduled_deletions() -> None:
+    """Раз в секунду передает наступившие удаления группировщику"""
+
+    while True:
+        due = []
+        try:
+            due = await _pop_due(keys=[SCHEDULE_KEY], args=[time.time(), MAX_BATCH_SIZE])
+            for member in due:
+                chat_id, _, message_id = member.decode().partition(":")
+                deletion_coalescer.delete(chat_id=int(chat_id), message_id=int(message_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"Scheduled deletions failed | {traceback.format_exc()}")
+
+        if len(due) < MAX_BATCH_SIZE:
+            await asyncio.sleep(1)
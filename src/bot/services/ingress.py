@@ -0,0 +1,195 @@
+import asyncio
+import time
+import traceback
+from typing import Any
+
+import sentry_sdk
+from aiogram.types import Update
+from aiogram.types.update import UpdateTypeLookupError
+from loguru import logger
+
+from bot import metrics
+from bot.bot import bot, dp
+from settings import config
+
+from .routing import routing_snapshot
+from .unregistered import unregistered_groups
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson в зависимостях, stdlib json - запасной вариант
+    from json import loads as json_loads  # type: ignore[assignment]
+
+
+def parse_update(body: bytes) -> Update | None:
+    """Разбирает тело запроса webhook.
+
+    Сообщения супергрупп, которые обработчик все равно пропустит (группа не
+    зарегистрирована в боте, анонимный администратор), отбрасываются по нескольким
+    полям JSON без построения полного Update. None - апдейт отброшен.
+    """
+
+    data = json_loads(body)
+
+    dropped = get_drop_reason(data)
+    if dropped is not None:
+        reason, chat_id = dropped
+        metrics.ingress_dropped.labels(reason=reason).inc()
+        if reason == "unregistered":
+            unregistered_groups.observe(chat_id)
+        return None
+
+    return Update.model_validate(data, context={"bot": bot})
+
+
+def get_drop_reason(data: Any) -> tuple[str, int] | None:
+    """Причина отбросить апдейт и chat_id проверенной группы.
+
+    Апдейты с неожиданной структурой не отбрасываются: их отклонит полная валидация.
+    """
+
+    if not isinstance(data, dict):
+        return None
+
+    message = data.get("message")
+    if not isinstance(message, dict):
+        return None
+
+    chat = message.get("chat")
+    if not isinstance(chat, dict) or chat.get("type") != "supergroup":
+        return None
+
+    chat_id = chat.get("id")
+    if not isinstance(chat_id, int):
+        return None
+
+    sender = message.get("from")
+    if sender is None:
+        return "no_sender", chat_id
+    if not isinstance(sender, dict):
+        return None
+    if sender.get("username") == "GroupAnonymousBot":
+        return "anonymous_admin", chat_id
+
+    # Пока снимок маршрутизации не загружен, список групп неизвестен
+    if routing_snapshot.ready and not routing_snapshot.is_registered(chat_id):
+        return "unregistered", chat_id
+    return None
+
+
+def get_update_chat_id(update: Update) -> int | None:
+    """Чат, к которому относится апдейт (для лички и inline-режима - пользователь)"""
+
+    try:
+        event = update.event
+    except UpdateTypeLookupError:
+        return None
+
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return int(chat.id)
+
+    message = getattr(event, "message", None)
+    if message is not None and getattr(message, "chat", None) is not None:
+        return int(message.chat.id)
+
+    user = getattr(event, "from_user", None) or getattr(event, "user", None)
+    if user is not None:
+        return int(user.id)
+    return None
+
+
+def get_partition(update: Update, partitions: int) -> int:
+    """Партиция апдейта: апдейты одного чата всегда попадают в одну и ту же"""
+
+    chat_id = get_update_chat_id(update)
+    key = chat_id if chat_id is not None else update.update_id
+    return key % partitions
+
+
+def _log_update(update: Update) -> None:
+    if config.debug:
+        from_user = getattr(update.event, "from_user", None)
+        from_username = from_user.username if from_user else None
+        logger.info(f"Got update | update_id={update.update_id} | from={from_username}")
+
+
+async def feed_update(update: Update, redelivered: bool = False) -> None:
+    """Передает апдейт диспетчеру и дожидается обработки, ошибки обработчиков пробрасываются.
+
+    Для шины: упавшая запись остается неподтвержденной и доставляется повторно.
+    redelivered - запись, которую не подтвердил упавший консьюмер.
+    """
+
+    _log_update(update)
+    await dp.feed_update(bot, update, redelivered=redelivered)
+
+
+async def process_update(update: Update) -> None:
+    """Передает апдейт диспетчеру, ошибки обработчиков только логируются.
+
+    Для webhook: Telegram не повторит апдейт, на который уже получил ответ.
+    """
+
+    try:
+        _log_update(update)
+        await dp.feed_webhook_update(bot, update)
+    except Exception as ex:
+        sentry_sdk.capture_exception(ex)
+        logger.error(traceback.format_exc())
+
+
+class UpdateQueue:
+    """Очередь апдейтов webhook, которую разбирают воркеры внутри процесса.
+
+    Апдейты раскладываются по воркерам по chat_id, поэтому апдейты одного чата
+    обрабатываются строго по порядку, а разные чаты - параллельно. У каждого воркера
+    своя ограниченная очередь: если она заполнена, апдейт не принимается и Telegram
+    повторит его позже.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        maxsize = max(1, queue_size // workers)
+        self._queues: list[asyncio.Queue[tuple[Update, float]]] = [
+            asyncio.Queue(maxsize=maxsize) for _ in range(workers)
+        ]
+        self._workers: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._work(queue), name=f"update_worker_{number}")
+            for number, queue in enumerate(self._queues)
+        ]
+
+    def put(self, update: Update) -> bool:
+        """Ставит апдейт в очередь, False - очередь воркера заполнена"""
+
+        queue = self._queues[get_partition(update, len(self._queues))]
+
+        try:
+            queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            return False
+
+        metrics.ingress_queue_depth.inc()
+        return True
+
+    async def _work(self, queue: asyncio.Queue[tuple[Update, float]]) -> None:
+        while True:
+            update, queued_at = await queue.get()
+            metrics.ingress_queue_depth.dec()
+            metrics.ingress_wait_seconds.observe(time.monotonic() - queued_at)
+            try:
+                await process_update(update)
+            finally:
+                queue.task_done()
+
+    async def stop(self) -> None:
+        """Дожидается обработки принятых апдейтов и останавливает воркеров"""
+
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
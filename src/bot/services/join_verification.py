@@ -0,0 +1,69 @@
+import asyncio
+import traceback
+
+import sentry_sdk
+from loguru import logger
+
+from bot import metrics
+from settings import config
+
+from . import membership
+from .outbound import Priority, TokenBucket, outbound_priority
+
+
+class JoinVerifier:
+    """Фоновая проверка подписок новых участников групп.
+
+    Результаты попадают в кэш подписок, поэтому первое сообщение подписанного
+    участника одобряется без запросов в Bot API. Проверки идут с фоновым приоритетом и
+    не чаще join_verification.rate в секунду, а при массовом вступлении лишние
+    проверки отбрасываются - такие участники будут проверены на первом сообщении.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[tuple[list[int], int]] = asyncio.Queue(
+            maxsize=config.join_verification.queue_size
+        )
+        self._bucket = TokenBucket(
+            rate=config.join_verification.rate, capacity=config.join_verification.rate
+        )
+        self._workers: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"join_verifier_{number}")
+            for number in range(config.join_verification.workers)
+        ]
+
+    def add(self, chat_ids: list[int], user_id: int) -> None:
+        try:
+            self._queue.put_nowait((chat_ids, user_id))
+        except asyncio.QueueFull:
+            metrics.join_verifications.labels(result="dropped").inc()
+            return
+
+        metrics.join_verifications.labels(result="queued").inc()
+
+    async def _work(self) -> None:
+        while True:
+            chat_ids, user_id = await self._queue.get()
+
+            while wait := self._bucket.try_take():
+                await asyncio.sleep(wait)
+
+            try:
+                with outbound_priority(Priority.BACKGROUND):
+                    await membership.verify_memberships(chat_ids=chat_ids, user_id=user_id)
+                metrics.join_verifications.labels(result="verified").inc()
+            except Exception as ex:
+                sentry_sdk.capture_exception(ex)
+                logger.error(f"Join verification failed | {user_id=} | {traceback.format_exc()}")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+join_verifier = JoinVerifier()
@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, TypeVar
+from weakref import WeakValueDictionary
+
+from settings import config
+
+T = TypeVar("T")
+
+
+class FanOutLimiter:
+    """Ограничивает число одновременных запросов в Bot API глобально и в рамках одного чата"""
+
+    def __init__(self, global_limit: int, per_key_limit: int):
+        self._global = asyncio.Semaphore(global_limit)
+        self._per_key_limit = per_key_limit
+        self._per_key: WeakValueDictionary[int, asyncio.Semaphore] = WeakValueDictionary()
+
+    @asynccontextmanager
+    async def slot(self, key: int) -> AsyncIterator[None]:
+        semaphore = self._per_key.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._per_key_limit)
+            self._per_key[key] = semaphore
+
+        async with semaphore, self._global:
+            yield
+
+
+async def gather_or_cancel(*aws: Awaitable[T]) -> list[T]:
+    """Аналог asyncio.gather, который при первой ошибке отменяет оставшиеся задачи"""
+
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    if not tasks:
+        return []
+
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    errors = [task.exception() for task in done]
+    for error in errors:
+        if error is not None:
+            raise error
+
+    return [task.result() for task in tasks]
+
+
+fan_out_limiter = FanOutLimiter(
+    global_limit=config.fan_out.global_limit,
+    per_key_limit=config.fan_out.per_group_limit,
+)
@@ -0,0 +1,132 @@
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from bot import metrics
+from bot.bot import bot
+from db import rd
+from settings import config
+
+from . import breaker
+
+SUBSCRIBED_STATUSES = (
+    ChatMemberStatus.MEMBER,
+    ChatMemberStatus.CREATOR,
+    ChatMemberStatus.ADMINISTRATOR,
+)
+
+
+def is_subscribed(status: ChatMemberStatus | str) -> bool:
+    return status in SUBSCRIBED_STATUSES
+
+
+def _cache_key(chat_id: int, user_id: int) -> str:
+    return f"{config.membership_cache.prefix}:{chat_id}:{user_id}"
+
+
+def _index_key(chat_id: int) -> str:
+    return f"{config.membership_cache.prefix}:index:{chat_id}"
+
+
+async def get_cached_memberships(chat_ids: list[int], user_id: int) -> dict[int, bool | None]:
+    """Возвращает известные вердикты подписки пользователя на каналы.
+
+    Сначала используется индекс, собранный из chat_member апдейтов каналов, затем
+    TTL-кэш результатов getChatMember. Все запросы уходят в Redis одним пайплайном,
+    None - вердикт неизвестен и нужен запрос в Bot API.
+    """
+
+    if not config.membership_cache.turned_on or not chat_ids:
+        return {chat_id: None for chat_id in chat_ids}
+
+    async with rd.pipeline(transaction=False) as pipe:
+        for chat_id in chat_ids:
+            pipe.hget(_index_key(chat_id), str(user_id))
+        pipe.mget([_cache_key(chat_id, user_id) for chat_id in chat_ids])
+        *indexed, cached = await pipe.execute()
+
+    result: dict[int, bool | None] = {}
+    for chat_id, index_value, cache_value in zip(chat_ids, indexed, cached):
+        if index_value is not None:
+            metrics.membership_cache_requests.labels(result="index").inc()
+            result[chat_id] = index_value == b"1"
+        elif cache_value is not None:
+            metrics.membership_cache_requests.labels(result="hit").inc()
+            result[chat_id] = cache_value == b"1"
+        else:
+            metrics.membership_cache_requests.labels(result="miss").inc()
+            result[chat_id] = None
+
+    return result
+
+
+async def track_membership(chat_id: int, user_id: int, subscribed: bool) -> None:
+    """Обновляет индекс подписчиков канала по chat_member апдейту"""
+
+    if not config.membership_cache.turned_on:
+        return
+
+    index_ttl = max(
+        config.membership_cache.index_ttl,
+        config.membership_cache.positive_ttl,
+        config.membership_cache.negative_ttl,
+    )
+    async with rd.pipeline(transaction=False) as pipe:
+        pipe.hset(_index_key(chat_id), str(user_id), "1" if subscribed else "0")
+        pipe.expire(_index_key(chat_id), index_ttl)
+        pipe.hlen(_index_key(chat_id))
+        pipe.delete(_cache_key(chat_id, user_id))
+        _, _, size, _ = await pipe.execute()
+
+    # Без индекса вердикты берутся из TTL-кэша и getChatMember
+    if size > config.membership_cache.index_max_size:
+        await drop_index(chat_id)
+
+
+async def drop_index(chat_id: int) -> None:
+    """Сбрасывает индекс канала, когда апдейты по нему могли быть пропущены"""
+
+    await rd.delete(_index_key(chat_id))
+
+
+async def cache_membership(chat_id: int, user_id: int, subscribed: bool) -> None:
+    if not config.membership_cache.turned_on:
+        return
+
+    ttl = (
+        config.membership_cache.positive_ttl
+        if subscribed
+        else config.membership_cache.negative_ttl
+    )
+    await rd.set(_cache_key(chat_id, user_id), "1" if subscribed else "0", ex=ttl)
+
+
+async def verify_memberships(chat_ids: list[int], user_id: int) -> dict[int, bool | None]:
+    """Вердикты подписки пользователя на каналы: из кэша, неизвестные - через getChatMember.
+
+    None - проверить подписку не удалось (бота нет в канале).
+    """
+
+    result = await get_cached_memberships(chat_ids, user_id)
+    states = await breaker.get_states(
+        [chat_id for chat_id, subscribed in result.items() if subscribed is None]
+    )
+
+    for chat_id, state in states.items():
+        if state == "open":
+            continue
+
+        try:
+            member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        except (TelegramBadRequest, TelegramForbiddenError):
+            await breaker.record_failure(chat_id)
+            continue
+
+        if state == "probe":
+            await breaker.record_success(chat_id)
+
+        result[chat_id] = is_subscribed(member.status)
+        await cache_membership(
+            chat_id=chat_id, user_id=user_id, subscribed=is_subscribed(member.status)
+        )
+
+    return result
@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import TYPE_CHECKING, Iterator
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    Response,
+    TelegramMethod,
+    DeleteMessage,
+    DeleteMessages,
+    GetChat,
+    GetChatMember,
+    GetMe,
+    GetUpdates,
+    RestrictChatMember,
+)
+from aiogram.methods.base import TelegramType
+from loguru import logger
+
+from bot import metrics
+from settings import config
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+
+class Priority(IntEnum):
+    """Классы приоритета исходящих запросов, меньше - важнее"""
+
+    MODERATION = 0
+    MEMBERSHIP = 1
+    WARNING = 2
+    MENU = 3
+    BACKGROUND = 4
+
+
+class OutboundDropped(Exception):
+    """Запрос не отправлен: лимит сообщений в группу занят дольше outbound.max_chat_wait"""
+
+
+_priority_override: ContextVar[Priority | None] = ContextVar("priority_override", default=None)
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    """Задает приоритет всем запросам в Bot API внутри блока (например, фоновым задачам)"""
+
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def get_priority(method: TelegramMethod[TelegramType]) -> Priority:
+    override = _priority_override.get()
+    if override is not None:
+        return override
+    return get_default_priority(method)
+
+
+def get_default_priority(method: TelegramMethod[TelegramType]) -> Priority:
+    """Приоритет метода без учета outbound_priority"""
+
+    if isinstance(method, (DeleteMessage, DeleteMessages, RestrictChatMember)):
+        return Priority.MODERATION
+    if isinstance(method, (GetChatMember, GetChat, GetMe)):
+        return Priority.MEMBERSHIP
+    if _get_group_chat_id(method) is not None:
+        return Priority.WARNING
+    return Priority.MENU
+
+
+def _get_group_chat_id(method: TelegramMethod[TelegramType]) -> int | None:
+    """chat_id группы для методов, отправляющих в нее новые сообщения"""
+
+    if not method.__api_method__.startswith(("send", "copy", "forward")):
+        return None
+
+    chat_id = getattr(method, "chat_id", None)
+    if isinstance(chat_id, int) and chat_id < 0:
+        return chat_id
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def try_take(self) -> float:
+        """Забирает токен и возвращает 0 или возвращает, сколько секунд ждать следующего"""
+
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        available = self.tokens + (now - self.updated) * self.rate
+        return now >= self.blocked_until and available >= self.capacity
+
+
+class PriorityLimiter:
+    """Выдает токены общего лимита ожидающим в порядке приоритета, затем очереди"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+        self._dispatcher: asyncio.Task[None] | None = None
+
+    async def acquire(self, priority: Priority) -> None:
+        if not self._waiters and not self.bucket.try_take():
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # Ожидающий запрос отменили
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = self.bucket.try_take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Планировщик всех исходящих запросов бота в Bot API.
+
+    Подключается к сессии бота, поэтому работает для любых вызовов (message.answer,
+    bot.get_chat_member и т.д.) без изменений в обработчиках. Соблюдает общий лимит
+    Telegram и лимит сообщений в одну группу, при TelegramRetryAfter ждет и повторяет
+    запрос. Сообщение в группу, которое ждало бы своей очереди дольше
+    outbound.max_chat_wait, не отправляется (OutboundDropped). Лимиты действуют в рамках
+    одного процесса.
+    """
+
+    def __init__(self) -> None:
+        self.limiter = PriorityLimiter(
+            TokenBucket(rate=config.outbound.global_rate, capacity=config.outbound.global_rate)
+        )
+        self._chat_buckets: dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.idle
+                }
+
+            rate = config.outbound.chat_rate_per_minute
+            bucket = TokenBucket(rate=rate / 60, capacity=rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, method: TelegramMethod[TelegramType], priority: Priority) -> None:
+        chat_id = _get_group_chat_id(method)
+        if chat_id is not None:
+            # Ожидание ограничено: обработчик шумной группы иначе спал бы сколько угодно и
+            # задерживал остальные чаты своей партиции
+            bucket = self._chat_bucket(chat_id)
+            deadline = time.monotonic() + config.outbound.max_chat_wait
+            while wait := bucket.try_take():
+                if time.monotonic() + wait > deadline:
+                    metrics.outbound_dropped.labels(priority=priority.name).inc()
+                    raise OutboundDropped(
+                        f"{method.__api_method__} to {chat_id=} dropped, chat limit is exhausted"
+                    )
+                await asyncio.sleep(wait)
+
+        await self.limiter.acquire(priority)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if method.__api_method__ == GetUpdates.__api_method__:
+            # Long polling не расходует лимиты Telegram
+            return await make_request(bot, method)
+
+        priority = get_priority(method)
+        attempt = 0
+
+        while True:
+            started = time.monotonic()
+            metrics.outbound_queue_depth.labels(priority=priority.name).inc()
+            try:
+                await self._wait_turn(method, priority)
+            finally:
+                metrics.outbound_queue_depth.labels(priority=priority.name).dec()
+            metrics.outbound_wait_seconds.labels(priority=priority.name).observe(
+                time.monotonic() - started
+            )
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as ex:
+                metrics.outbound_retry_after.labels(priority=priority.name).inc()
+
+                chat_id = _get_group_chat_id(method)
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).block(ex.retry_after)
+                else:
+                    self.limiter.bucket.block(ex.retry_after)
+
+                attempt += 1
+                if attempt > config.outbound.max_retries:
+                    raise
+
+                logger.warning(
+                    f"Flood control | method={method.__api_method__} | "
+                    f"retry_after={ex.retry_after} | {attempt=}"
+                )
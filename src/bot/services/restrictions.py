@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import ChatPermissions
+from loguru import logger
+
+from bot.bot import bot
+from db import rd
+from settings import config
+
+from . import membership
+from .routing import get_group_route
+
+# Права по умолчанию, если у группы они не заданы
+DEFAULT_PERMISSIONS = ChatPermissions(
+    can_send_messages=True,
+    can_send_audios=True,
+    can_send_documents=True,
+    can_send_photos=True,
+    can_send_videos=True,
+    can_send_video_notes=True,
+    can_send_voice_notes=True,
+    can_send_polls=True,
+    can_send_other_messages=True,
+    can_add_web_page_previews=True,
+)
+
+
+def _restricted_key(user_id: int) -> str:
+    return f"{config.restrictions.prefix}:{user_id}"
+
+
+def _failed_key(chat_id: int, user_id: int) -> str:
+    return f"{config.restrictions.prefix}:failed:{chat_id}:{user_id}"
+
+
+async def restrict_member(chat_id: int, user_id: int) -> bool:
+    """Запрещает неподписчику писать в группу на restrictions.window секунд.
+
+    False - ограничить не удалось (у бота нет прав или пользователь администратор),
+    и сообщения пользователя нужно удалять как обычно. Неудача запоминается на
+    restrictions.window секунд, чтобы не повторять заведомо неудачный запрос на
+    каждое сообщение.
+    """
+
+    if await rd.exists(_failed_key(chat_id, user_id)):
+        return False
+
+    try:
+        await bot.restrict_chat_member(
+            chat_id=chat_id,
+            user_id=user_id,
+            permissions=ChatPermissions(can_send_messages=False),
+            until_date=timedelta(seconds=config.restrictions.window),
+        )
+    except (TelegramBadRequest, TelegramForbiddenError) as ex:
+        logger.warning(f"Failed to restrict member | {chat_id=} | {user_id=} | {ex=}")
+        await rd.set(_failed_key(chat_id, user_id), "1", ex=config.restrictions.window)
+        return False
+
+    async with rd.pipeline(transaction=False) as pipe:
+        pipe.hset(_restricted_key(user_id), str(chat_id), "1")
+        pipe.expire(_restricted_key(user_id), config.restrictions.window)
+        await pipe.execute()
+
+    return True
+
+
+async def lift_restriction(chat_id: int, user_id: int) -> None:
+    """Возвращает пользователю права, которые действуют в группе по умолчанию"""
+
+    try:
+        chat = await bot.get_chat(chat_id=chat_id)
+        await bot.restrict_chat_member(
+            chat_id=chat_id,
+            user_id=user_id,
+            permissions=chat.permissions or DEFAULT_PERMISSIONS,
+        )
+    except (TelegramBadRequest, TelegramForbiddenError) as ex:
+        logger.warning(f"Failed to lift restriction | {chat_id=} | {user_id=} | {ex=}")
+    else:
+        logger.info(f"Restriction lifted | {chat_id=} | {user_id=}")
+
+    await rd.hdel(_restricted_key(user_id), str(chat_id))
+
+
+async def lift_if_subscribed(user_id: int) -> None:
+    """Снимает ограничения в группах, на все каналы которых пользователь теперь подписан"""
+
+    for value in await rd.hkeys(_restricted_key(user_id)):
+        chat_id = int(value)
+        group = await get_group_route(chat_id)
+
+        if group is None:
+            await rd.hdel(_restricted_key(user_id), str(chat_id))
+            continue
+
+        memberships = await membership.verify_memberships(
+            chat_ids=[chat.chat_id for chat in group.checked_chats], user_id=user_id
+        )
+        if all(memberships.values()):
+            await lift_restriction(chat_id=chat_id, user_id=user_id)
@@ -0,0 +1,223 @@
+import asyncio
+import time
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import asyncpg
+import sentry_sdk
+from loguru import logger
+
+from bot import metrics
+from db import CHECKOUT_TIME_KEY, Session
+from db.manager import DBManager, ROUTING_CHANNEL
+from settings import config
+
+from .unregistered import unregistered_groups
+
+
+@dataclass(frozen=True)
+class CheckedChat:
+    """Канал/чат, подписку на который требует группа"""
+
+    id: int
+    chat_id: int
+    title: str | None
+    username: str | None
+    invite_link: str | None
+    health: str
+
+
+@dataclass(frozen=True)
+class GroupRoute:
+    """Все, что нужно для модерации сообщения в группе, без обращений к БД"""
+
+    id: int
+    uid: int
+    chat_id: int
+    title: str | None
+    enforcement_mode: str
+    health: str
+    owner_status: bool
+    checked_chats: tuple[CheckedChat, ...]
+
+
+def build_routes(rows: Iterable[Any]) -> list[GroupRoute]:
+    """Собирает маршруты из строк DBManager.get_group_routes (по строке на привязку)"""
+
+    groups: dict[int, Any] = {}
+    checked: dict[int, list[CheckedChat]] = defaultdict(list)
+
+    for row in rows:
+        groups.setdefault(row.id, row)
+        if row.checked_id is not None:
+            checked[row.id].append(
+                CheckedChat(
+                    id=row.checked_id,
+                    chat_id=row.checked_chat_id,
+                    title=row.checked_title,
+                    username=row.checked_username,
+                    invite_link=row.checked_invite_link,
+                    health=row.checked_health,
+                )
+            )
+
+    return [
+        GroupRoute(
+            id=row.id,
+            uid=row.uid,
+            chat_id=row.chat_id,
+            title=row.title,
+            enforcement_mode=row.enforcement_mode,
+            health=row.health,
+            owner_status=bool(row.owner_status),
+            checked_chats=tuple(checked[row.id]),
+        )
+        for row in groups.values()
+    ]
+
+
+async def load_group_route(dbm: DBManager, chat_id: int) -> GroupRoute | None:
+    """Маршрут группы напрямую из БД (один запрос), когда снимок недоступен"""
+
+    routes = build_routes(await dbm.get_enforcement_context(chat_id=chat_id))
+
+    # Одну группу могли добавить несколько пользователей - берем самую раннюю запись
+    return routes[0] if routes else None
+
+
+class RoutingSnapshot:
+    """Снимок таблицы маршрутизации групп в памяти процесса.
+
+    Загружается целиком при старте и обновляется точечно по NOTIFY, которые
+    DBManager отправляет при изменении chats, chat_links и users. Пока соединение
+    для LISTEN не установлено, ready=False и данные нужно брать из БД.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self._by_pk: dict[int, GroupRoute] = {}
+        self._pks_by_chat_id: dict[int, set[int]] = defaultdict(set)
+
+    def is_registered(self, chat_id: int) -> bool:
+        return chat_id in self._pks_by_chat_id
+
+    def get(self, chat_id: int) -> GroupRoute | None:
+        pks = self._pks_by_chat_id.get(chat_id)
+        if not pks:
+            return None
+
+        # Одну группу могли добавить несколько пользователей - как и DBManager.get_chat,
+        # берем самую раннюю запись
+        return self._by_pk[min(pks)]
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                sentry_sdk.capture_exception(ex)
+                logger.error(f"Routing snapshot listener failed | {traceback.format_exc()}")
+
+            await asyncio.sleep(config.routing.reconnect_delay)
+
+    async def _listen(self) -> None:
+        events: asyncio.Queue[str | None] = asyncio.Queue()
+
+        conn = await asyncpg.connect(config.db.dsn)
+        try:
+            conn.add_termination_listener(lambda _conn: events.put_nowait(None))
+            await conn.add_listener(
+                ROUTING_CHANNEL,
+                lambda _conn, _pid, _channel, payload: events.put_nowait(payload),
+            )
+
+            # Уведомления, пришедшие во время полной загрузки, применяются после нее
+            await self._load()
+            self.ready = True
+            logger.info(f"Routing snapshot loaded | groups={len(self._by_pk)}")
+
+            while (payload := await events.get()) is not None:
+                await self._apply(payload)
+        finally:
+            self.ready = False
+            if not conn.is_closed():
+                await conn.close()
+
+    async def _apply(self, payload: str) -> None:
+        kind, _, value = payload.partition(":")
+        pk = int(value)
+
+        if kind == "chat":
+            # Изменилась сама группа или канал, на который ссылаются группы
+            pks = {pk} | {
+                route.id
+                for route in self._by_pk.values()
+                if any(chat.id == pk for chat in route.checked_chats)
+            }
+            await self._load(group_ids=list(pks))
+        elif kind == "link":
+            await self._load(group_ids=[pk])
+        elif kind == "user":
+            await self._load(user_id=pk)
+        else:
+            logger.warning(f"Unknown routing notification | {payload=}")
+
+    async def _load(self, group_ids: list[int] | None = None, user_id: int | None = None) -> None:
+        async with Session() as session:
+            dbm = DBManager(session)
+            rows = await dbm.get_group_routes(group_ids=group_ids, user_id=user_id)
+
+        routes = build_routes(rows)
+
+        if group_ids is None and user_id is None:
+            stale = list(self._by_pk)
+        elif group_ids is not None:
+            stale = [pk for pk in group_ids if pk in self._by_pk]
+        else:
+            stale = [pk for pk, route in self._by_pk.items() if route.uid == user_id]
+
+        for pk in stale:
+            route = self._by_pk.pop(pk)
+            self._pks_by_chat_id[route.chat_id].discard(pk)
+            if not self._pks_by_chat_id[route.chat_id]:
+                del self._pks_by_chat_id[route.chat_id]
+
+        for route in routes:
+            self._by_pk[route.id] = route
+            self._pks_by_chat_id[route.chat_id].add(route.id)
+            unregistered_groups.discard(route.chat_id)
+
+
+routing_snapshot = RoutingSnapshot()
+
+
+async def get_group_route(chat_id: int) -> GroupRoute | None:
+    """Стадия БД: маршрут группы в виде обычных данных.
+
+    Соединение с БД возвращается в пул до любых запросов в Telegram и Redis. Группы,
+    которых нет в БД, запоминаются в негативном кэше.
+    """
+
+    if routing_snapshot.ready:
+        route = routing_snapshot.get(chat_id)
+    elif await unregistered_groups.contains(chat_id):
+        route = None
+    else:
+        async with Session() as session:
+            started = time.perf_counter()
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            metrics.db_pool_wait_seconds.observe(raw_connection.info[CHECKOUT_TIME_KEY] - started)
+
+            route = await load_group_route(DBManager(session), chat_id=chat_id)
+
+        if route is None:
+            await unregistered_groups.add(chat_id)
+
+    if route is None:
+        unregistered_groups.observe(chat_id)
+    return route
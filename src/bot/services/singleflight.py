@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+from typing import TYPE_CHECKING, Any
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod, GetChat, GetChatMember, GetMe
+from aiogram.methods.base import TelegramType
+
+from bot import metrics
+
+from .outbound import get_default_priority, outbound_priority
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Методы только на чтение, одинаковые вызовы которых можно объединять
+COALESCED_METHODS = frozenset(method.__api_method__ for method in (GetChatMember, GetChat, GetMe))
+
+
+class SingleFlight(BaseRequestMiddleware):
+    """Объединяет одновременные одинаковые запросы в Bot API в один.
+
+    Пока запрос выполняется, такие же запросы (например, getChatMember одного
+    пользователя в одном канале из частей альбома) ждут его ответа, а не уходят в
+    Telegram повторно. Запрос выполняется отдельной задачей, поэтому отмена одного из
+    ожидающих не отменяет его для остальных. Задача создается в пустом контексте с
+    приоритетом метода по умолчанию: иначе она унаследовала бы outbound_priority
+    первого вызывающего, и запросы обработчиков ждали бы в очереди фоновых задач.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[tuple[str, str], asyncio.Future[Any]] = {}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if method.__api_method__ not in COALESCED_METHODS:
+            return await make_request(bot, method)
+
+        key = (method.__api_method__, method.model_dump_json(exclude_none=True))
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            metrics.singleflight_coalesced.labels(method=method.__api_method__).inc()
+        else:
+            future = contextvars.Context().run(
+                asyncio.ensure_future, self._request(make_request, bot, method)
+            )
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+
+        response: Response[TelegramType] = await asyncio.shield(future)
+        return response
+
+    @staticmethod
+    async def _request(
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with outbound_priority(get_default_priority(method)):
+            return await make_request(bot, method)
+
+    def _done(self, key: tuple[str, str], future: asyncio.Future[Any]) -> None:
+        del self._in_flight[key]
+
+        # Ошибку получают ожидающие, но если их всех отменили, она не должна попасть в лог
+        # как необработанная
+        if not future.cancelled():
+            future.exception()
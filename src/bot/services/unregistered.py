@@ -0,0 +1,135 @@
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+
+import sentry_sdk
+from aiogram.exceptions import TelegramAPIError
+from loguru import logger
+
+from bot import metrics
+from bot.bot import bot
+from db import Session, rd
+from db.manager import DBManager
+from settings import config
+
+from .outbound import Priority, outbound_priority
+
+
+def _cache_key(chat_id: int) -> str:
+    return f"{config.unregistered.prefix}:{chat_id}"
+
+
+class UnregisteredGroups:
+    """Негативный кэш супергрупп, в которых есть бот, но которые не добавлены в бота.
+
+    Без снимка маршрутизации каждое сообщение такой группы стоило бы запроса в БД.
+    Отрицательный ответ БД запоминается в Redis на unregistered.ttl секунд (общий для
+    всех процессов) и в памяти процесса на unregistered.local_ttl секунд. Запись
+    снимается при добавлении группы: в chat_shared и по NOTIFY в снимке маршрутизации.
+
+    Если задан unregistered.leave_after, бот выходит из группы, которая остается
+    незарегистрированной дольше этого срока, и Telegram перестает присылать ее апдейты.
+    """
+
+    def __init__(self) -> None:
+        self._local: OrderedDict[int, float] = OrderedDict()
+        self._first_seen: OrderedDict[int, float] = OrderedDict()
+        self._leaving: set[int] = set()
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def _remember_local(self, chat_id: int) -> None:
+        self._local[chat_id] = time.monotonic() + config.unregistered.local_ttl
+        self._local.move_to_end(chat_id)
+        if len(self._local) > config.unregistered.lru_size:
+            self._local.popitem(last=False)
+
+    async def contains(self, chat_id: int) -> bool:
+        """True - группа недавно не нашлась в БД и запрос можно не делать"""
+
+        if not config.unregistered.turned_on:
+            return False
+
+        expires = self._local.get(chat_id)
+        if expires is not None:
+            if expires > time.monotonic():
+                metrics.unregistered_cache.labels(result="local").inc()
+                return True
+            del self._local[chat_id]
+
+        if await rd.exists(_cache_key(chat_id)):
+            metrics.unregistered_cache.labels(result="redis").inc()
+            self._remember_local(chat_id)
+            return True
+
+        metrics.unregistered_cache.labels(result="miss").inc()
+        return False
+
+    async def add(self, chat_id: int) -> None:
+        if not config.unregistered.turned_on:
+            return
+
+        await rd.set(_cache_key(chat_id), "1", ex=config.unregistered.ttl)
+        self._remember_local(chat_id)
+
+    def discard(self, chat_id: int) -> None:
+        """Снимает запись в памяти процесса (группу добавили в бота)"""
+
+        self._local.pop(chat_id, None)
+        self._first_seen.pop(chat_id, None)
+
+    async def forget(self, chat_id: int) -> None:
+        self.discard(chat_id)
+        await rd.delete(_cache_key(chat_id))
+
+    def observe(self, chat_id: int) -> None:
+        """Учитывает сообщение незарегистрированной группы для выхода из нее"""
+
+        if not config.unregistered.leave_after or chat_id in self._leaving:
+            return
+
+        now = time.monotonic()
+        first_seen = self._first_seen.setdefault(chat_id, now)
+        if len(self._first_seen) > config.unregistered.lru_size:
+            self._first_seen.popitem(last=False)
+
+        if now - first_seen < config.unregistered.leave_after:
+            return
+
+        self._leaving.add(chat_id)
+        task = asyncio.create_task(self._leave(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _leave(self, chat_id: int) -> None:
+        try:
+            # Кэш мог устареть - перед выходом группа проверяется по БД
+            async with Session() as session:
+                rows = await DBManager(session).get_enforcement_context(chat_id=chat_id)
+            if rows:
+                await self.forget(chat_id)
+                return
+
+            with outbound_priority(Priority.BACKGROUND):
+                await bot.leave_chat(chat_id=chat_id)
+
+            metrics.unregistered_left.inc()
+            logger.info(f"Left unregistered group | {chat_id=}")
+            self.discard(chat_id)
+        except TelegramAPIError as ex:
+            logger.warning(f"Failed to leave unregistered group | {chat_id=} | {ex=}")
+            self._first_seen[chat_id] = time.monotonic()
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(
+                f"Unregistered group check failed | {chat_id=} | {traceback.format_exc()}"
+            )
+            self._first_seen[chat_id] = time.monotonic()
+        finally:
+            self._leaving.discard(chat_id)
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+unregistered_groups = UnregisteredGroups()
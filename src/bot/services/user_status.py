@@ -0,0 +1,350 @@
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import suppress
+
+import sentry_sdk
+from loguru import logger
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError
+from sqlalchemy.exc import NoResultFound
+
+from bot import metrics
+from db import Session, rd
+from db.manager import DBManager
+from settings import config
+
+
+# Служебный элемент множества заблокированных, добавляется после полной загрузки из БД.
+# Пока его нет, множество неполное (потеряно или еще загружается)
+BLOCKED_MARKER = "0"
+
+# Блокировка загрузки статусов из БД, продлевается после каждой пачки
+WARM_UP_LOCK_TIMEOUT = 60
+
+# Добавляет (sadd) или убирает (srem) chat_id во множествах KEYS: в первом - если ARGV[3]
+# равен 1 или множество уже есть, в остальных (собираемое множество) - только если они есть
+_update_blocked = rd.register_script(
+    "for number, key in ipairs(KEYS) do "
+    "if (number == 1 and ARGV[3] == '1') or redis.call('exists', key) == 1 then "
+    "redis.call(ARGV[2], key, ARGV[1]) end end"
+)
+
+
+def _user_key(chat_id: int) -> str:
+    return f"{config.redis.prefix}:{chat_id}"
+
+
+def _building_key() -> str:
+    """Множество заблокированных, которое собирается из БД и затем заменяет blocked_key"""
+
+    return f"{config.auth_cache.blocked_key}:building"
+
+
+def _warmed_key() -> str:
+    return f"{config.auth_cache.channel}:warmed"
+
+
+def _warm_up_lock() -> Lock:
+    lock: Lock = rd.lock(
+        f"{config.auth_cache.channel}:warm_up", timeout=WARM_UP_LOCK_TIMEOUT, blocking=False
+    )
+    return lock
+
+
+async def _store_blocked(chat_id: int, status: bool | None, create: bool) -> None:
+    """Обновляет chat_id во множестве заблокированных и в собираемом множестве.
+
+    create=False - только если множество уже есть: в формате hash оно ведется, пока
+    идет или после переноса в set, чтобы переключение формата ничего не потеряло.
+    """
+
+    await _update_blocked(
+        keys=[config.auth_cache.blocked_key, _building_key()],
+        args=[chat_id, "sadd" if status is False else "srem", int(create)],
+    )
+
+
+async def store_status(
+    chat_id: int, status: bool | None, user_id: int, username: str | None
+) -> None:
+    """Записывает статус пользователя в Redis в формате auth_cache.storage.
+
+    hash - хэш id/username/status на пользователя, set - одно множество chat_id
+    заблокированных пользователей, обновляется атомарно без блокировок.
+    """
+
+    if config.auth_cache.storage == "set":
+        await _store_blocked(chat_id, status, create=True)
+        return
+
+    async with rd.lock(f"lock-{config.redis.prefix}:{chat_id}"):
+        await rd.hset(
+            _user_key(chat_id),
+            mapping={"id": user_id, "username": username or "", "status": str(status)},
+        )
+    await _store_blocked(chat_id, status, create=False)
+
+
+async def rebuild_blocked_set(lock: Lock, batch: int) -> int:
+    """Собирает множество заблокированных из БД и атомарно (RENAME) подменяет им blocked_key.
+
+    Пока множество собирается под временным ключом, store_status пишет и в него, поэтому
+    разблокировки во время сборки не теряются, а устаревшие записи не переживают ее.
+    lock - занятая _warm_up_lock. Возвращает число заблокированных.
+    """
+
+    building = _building_key()
+    await rd.delete(building)
+    # Множество создается сразу, чтобы store_status начал писать в него
+    await rd.sadd(building, BLOCKED_MARKER)
+
+    after_id = 0
+    total = 0
+    while True:
+        async with Session() as session:
+            users = await DBManager(session).get_users_page(
+                after_id=after_id, limit=batch, status=False
+            )
+        if not users:
+            break
+
+        await rd.sadd(building, *(user.chat_id for user in users))
+        after_id = users[-1].id
+        total += len(users)
+        # Без блокировки параллельная сборка удалила бы это множество
+        await lock.reacquire()
+
+    await rd.rename(building, config.auth_cache.blocked_key)
+    return total
+
+
+async def _read_status(chat_id: int) -> bool | None:
+    """Статус из Redis, None - его там нет"""
+
+    if config.auth_cache.storage == "set":
+        blocked, marker = await rd.smismember(
+            config.auth_cache.blocked_key, [chat_id, BLOCKED_MARKER]
+        )
+        return not blocked if marker else None
+
+    value = await rd.hget(_user_key(chat_id), "status")
+    return None if value is None else value != b"False"
+
+
+class UserStatusCache:
+    """Статусы пользователей для AuthMiddleware: память процесса, затем Redis, затем БД.
+
+    Записи в памяти живут auth_cache.local_ttl секунд и сбрасываются сообщениями в
+    Redis pub/sub канал auth_cache.channel, которые отправляет set_status. Пока
+    подписки на канал нет, сообщения могли потеряться, поэтому память не используется.
+    Если статуса в Redis нет (вытеснен или Redis перезапущен), он читается из БД и
+    записывается обратно в Redis. None - пользователя нет в БД.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self._local: OrderedDict[int, tuple[float, bool | None]] = OrderedDict()
+        self._restore_task: asyncio.Task[None] | None = None
+
+    def _remember_local(self, chat_id: int, status: bool | None) -> None:
+        self._local[chat_id] = (time.monotonic() + config.auth_cache.local_ttl, status)
+        self._local.move_to_end(chat_id)
+        if len(self._local) > config.auth_cache.lru_size:
+            self._local.popitem(last=False)
+
+    async def get(self, chat_id: int) -> bool | None:
+        use_local = config.auth_cache.turned_on and self.ready
+
+        if use_local:
+            cached = self._local.get(chat_id)
+            if cached is not None and cached[0] > time.monotonic():
+                metrics.user_status_cache.labels(result="local").inc()
+                return cached[1]
+
+        status = await _read_status(chat_id)
+        if status is not None:
+            metrics.user_status_cache.labels(result="redis").inc()
+        else:
+            metrics.user_status_cache.labels(result="db").inc()
+            status = await self._load(chat_id)
+            if config.auth_cache.storage == "set":
+                self._restore_blocked()
+
+        if use_local:
+            self._remember_local(chat_id, status)
+        return status
+
+    async def _load(self, chat_id: int) -> bool | None:
+        async with Session() as session:
+            try:
+                user = await DBManager(session).get_user(chat_id=chat_id)
+            except NoResultFound:
+                return None
+
+        await store_status(chat_id, user.status, user_id=user.id, username=user.username)
+        return user.status is not False
+
+    def _restore_blocked(self) -> None:
+        """Запускает загрузку множества заблокированных, если оно потеряно"""
+
+        if self._restore_task is None or self._restore_task.done():
+            self._restore_task = asyncio.create_task(self.warm_up())
+
+    async def set_status(self, chat_id: int, status: bool) -> None:
+        """Записывает статус в Redis и сбрасывает его в памяти всех процессов"""
+
+        if config.auth_cache.storage == "set":
+            await store_status(chat_id, status, user_id=0, username=None)
+        else:
+            await rd.hset(_user_key(chat_id), "status", str(status))
+            await _store_blocked(chat_id, status, create=False)
+        self._local.pop(chat_id, None)
+        await rd.publish(config.auth_cache.channel, str(chat_id))
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                sentry_sdk.capture_exception(ex)
+                logger.error(f"User status listener failed | {traceback.format_exc()}")
+
+            await asyncio.sleep(config.auth_cache.reconnect_delay)
+
+    async def _listen(self) -> None:
+        pubsub = rd.pubsub()
+        try:
+            await pubsub.subscribe(config.auth_cache.channel)
+
+            # Сообщения, отправленные без подписки, потеряны
+            self._local.clear()
+            self.ready = True
+
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self._local.pop(int(message["data"]), None)
+        finally:
+            self.ready = False
+            await pubsub.aclose()
+
+    async def warm_up(self) -> None:
+        """Загружает статусы всех пользователей из БД в Redis, если их там еще нет.
+
+        Загрузка нужна после потери данных Redis: в формате set - пока во множестве нет
+        BLOCKED_MARKER, в формате hash - пока нет отметки об уже выполненной загрузке.
+        """
+
+        if await self._is_warm():
+            return
+
+        # При нескольких воркерах загрузку выполняет один процесс
+        lock = _warm_up_lock()
+        if not await lock.acquire():
+            return
+
+        started = time.monotonic()
+        try:
+            total = await self._warm_up(lock)
+        except Exception as ex:
+            sentry_sdk.capture_exception(ex)
+            logger.error(f"User statuses warm up failed | {traceback.format_exc()}")
+            return
+        finally:
+            with suppress(LockError):
+                await lock.release()
+
+        logger.info(
+            f"User statuses warmed up | users={total} | seconds={time.monotonic() - started:.1f}"
+        )
+
+    @staticmethod
+    async def _is_warm() -> bool:
+        if config.auth_cache.storage == "set":
+            return bool(await rd.sismember(config.auth_cache.blocked_key, BLOCKED_MARKER))
+        return bool(await rd.exists(_warmed_key()))
+
+    @staticmethod
+    async def _warm_up(lock: Lock) -> int:
+        if config.auth_cache.storage == "set":
+            return await rebuild_blocked_set(lock, batch=config.auth_cache.warm_up_batch)
+
+        after_id = 0
+        total = 0
+
+        while True:
+            async with Session() as session:
+                users = await DBManager(session).get_users_page(
+                    after_id=after_id, limit=config.auth_cache.warm_up_batch
+                )
+            if not users:
+                await rd.set(_warmed_key(), "1")
+                return total
+
+            async with rd.pipeline(transaction=False) as pipe:
+                for user in users:
+                    pipe.hset(
+                        _user_key(user.chat_id),
+                        mapping={
+                            "id": user.id,
+                            "username": user.username or "",
+                            "status": str(user.status),
+                        },
+                    )
+                await pipe.execute()
+
+            after_id = users[-1].id
+            total += len(users)
+            await lock.reacquire()
+
+
+async def migrate_hashes_to_set(batch: int = 1000, delete: bool = False) -> dict[str, int]:
+    """Готовит множество заблокированных для перехода с формата hash на set.
+
+    Множество собирается из БД (rebuild_blocked_set), с этого момента store_status в
+    формате hash ведет его вместе с хэшами, поэтому auth_cache.storage можно
+    переключить в любой момент после переноса. Хэши читаются через SCAN, их память
+    (MEMORY USAGE) суммируется для отчета. С delete=True хэши удаляются.
+    """
+
+    lock = _warm_up_lock()
+    if not await lock.acquire():
+        raise RuntimeError("User statuses are being loaded by another process, retry later")
+
+    try:
+        report = {"hashes": 0, "blocked": 0, "hashes_bytes": 0, "set_bytes": 0}
+        report["blocked"] = await rebuild_blocked_set(lock, batch=batch)
+    finally:
+        with suppress(LockError):
+            await lock.release()
+
+    keys: list[bytes] = []
+
+    async def flush() -> None:
+        async with rd.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.memory_usage(key)
+            sizes = await pipe.execute()
+
+        if delete:
+            await rd.delete(*keys)
+
+        report["hashes"] += len(keys)
+        report["hashes_bytes"] += sum(size or 0 for size in sizes)
+        keys.clear()
+
+    async for key in rd.scan_iter(match=f"{config.redis.prefix}:*", count=batch, _type="hash"):
+        keys.append(key)
+        if len(keys) >= batch:
+            await flush()
+    if keys:
+        await flush()
+
+    report["set_bytes"] = await rd.memory_usage(config.auth_cache.blocked_key) or 0
+    return report
+
+
+user_status_cache = UserStatusCache()
@@ -0,0 +1,26 @@
+from db import Session, rd
+from db.manager import DBManager
+from settings import config
+
+USERS_COUNT_KEY = "subchecker:bot:users_count"
+
+
+async def refresh_users_count() -> None:
+    """Пересчитывает число пользователей для меню администратора"""
+
+    async with Session() as session:
+        count = await DBManager(session).count_users()
+
+    await rd.set(USERS_COUNT_KEY, count, ex=config.users_list.count_interval * 2)
+
+
+async def get_users_count() -> int:
+    """Число пользователей, посчитанное в фоне, или оценка Postgres, пока его нет"""
+
+    count = await rd.get(USERS_COUNT_KEY)
+    if count is not None:
+        return int(count)
+
+    async with Session() as session:
+        estimate: int = await DBManager(session).estimate_users_count()
+    return estimate
@@ -1,6 +1,12 @@
 from aiogram.types import InlineKeyboardMarkup, Message, CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
 from .bot import bot
+from .schemas.general import ChatHealth
+
+HEALTH_DESCRIPTIONS = {
+    ChatHealth.BOT_MISSING: "бот удален из чата",
+    ChatHealth.NO_RIGHTS: "у бота нет прав администратора",
+}
 
 
 async def send_message(
@@ -21,3 +27,13 @@ def get_callback_message(callback: CallbackQuery) -> Message:
     if not isinstance(callback.message, Message):
         raise ValueError("callback.message must be Message")
     return callback.message
+
+
+def health_mark(health: str) -> str:
+    """Пометка для списков в меню: чат недоступен боту и не проверяется"""
+
+    return "" if health == ChatHealth.OK else " ⚠️"
+
+
+def health_description(health: str) -> str:
+    return HEALTH_DESCRIPTIONS.get(ChatHealth(health), "в порядке")
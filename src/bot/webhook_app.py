@@ -1,24 +1,29 @@
-import traceback
 from typing import AsyncGenerator
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, status
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from db import create_tables
 from settings import config
-from aiogram.types import Update, FSInputFile
+from aiogram.types import FSInputFile
 from contextlib import asynccontextmanager
-import sentry_sdk
 from loguru import logger
+from redis.exceptions import RedisError
 
 from .bot import dp, bot
+from .services.bus import publish
+from .services.ingress import UpdateQueue, parse_update, process_update
+
+update_queue = UpdateQueue(workers=config.ingress.workers, queue_size=config.ingress.queue_size)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Контекстный менеджер для управления жизненным циклом приложения"""
 
-    await create_tables()
+    await dp.emit_startup(bot=bot)
+    if config.ingress.mode == "queue":
+        update_queue.start()
+
     await bot.set_webhook(
         url=config.telegram.webhook.url,
         certificate=(
@@ -26,10 +31,14 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             if config.telegram.webhook.ssl_cert
             else None
         ),
+        allowed_updates=dp.resolve_used_update_types(),
     )
     logger.success(f"Webhook установлен: {config.telegram.webhook.url}")
     yield
     await bot.delete_webhook()
+    if config.ingress.mode == "queue":
+        await update_queue.stop()
+    await dp.emit_shutdown(bot=bot)
     await bot.session.close()
     logger.success("Webhook удален, бот отключен.")
 
@@ -39,24 +48,31 @@ Instrumentator().instrument(webhook_app).expose(webhook_app)
 
 
 @webhook_app.post(config.telegram.webhook.path)
-async def webhook_handler(update: Update) -> dict[str, str]:
+async def webhook_handler(request: Request, response: Response) -> dict[str, str]:
     try:
-        from_username = None
-
-        if update.message:
-            from_username = update.message.from_user.username if update.message.from_user else None
-        elif update.callback_query:
-            from_username = (
-                update.callback_query.from_user.username
-                if update.callback_query.from_user
-                else None
-            )
-
-        if config.debug:
-            logger.info(f"Got update | update_id={update.update_id} | from={from_username}")
-
-        await dp.feed_webhook_update(bot, update)
-    except Exception as ex:
-        sentry_sdk.capture_exception(ex)
-        logger.error(traceback.format_exc())
+        update = parse_update(await request.body())
+    except ValueError as ex:
+        logger.error(f"Invalid webhook payload | {ex=}")
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        return {"status": "invalid"}
+
+    if update is None:
+        return {"status": "ok"}
+
+    if config.ingress.mode == "inline":
+        await process_update(update)
+    elif config.ingress.mode == "queue":
+        if not update_queue.put(update):
+            # Telegram повторит доставку позже
+            logger.warning(f"Update queue is full | update_id={update.update_id}")
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"status": "busy"}
+    else:
+        try:
+            await publish(update)
+        except RedisError:
+            logger.error(f"Update bus is unavailable | update_id={update.update_id}")
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"status": "busy"}
+
     return {"status": "ok"}
@@ -1,21 +1,38 @@
+import time
+from typing import Any
+
 import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
 
 from settings import config
 
-from .models import Base
 
+# Вместо pool_pre_ping соединение проверяется в обработчике checkout, чтобы время
+# ожидания пула (CHECKOUT_TIME_KEY) измерялось без пинга
+engine = create_async_engine(
+    config.db.url,
+    pool_size=config.db.pool_size,
+    max_overflow=config.db.max_overflow,
+)
 
-engine = create_async_engine(config.db.url, pool_pre_ping=True)
+# Ключ в info соединения: time.perf_counter() в момент выдачи соединения пулом
+CHECKOUT_TIME_KEY = "checkout_time"
 
-Session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
-rd = redis.Redis(host=config.redis.host, port=config.redis.port, db=config.redis.db)
+def ping_on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+    connection_record.info[CHECKOUT_TIME_KEY] = time.perf_counter()
+
+    # Пул переподключает соединение и повторяет checkout
+    if not engine.dialect.do_ping(dbapi_connection):
+        raise DisconnectionError()
+
 
+event.listen(engine.sync_engine, "checkout", ping_on_checkout)
 
-async def create_tables() -> None:
-    async with engine.begin() as conn:
-        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS processing;"))
-        await conn.run_sync(Base.metadata.create_all)
+
+Session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+rd = redis.Redis(host=config.redis.host, port=config.redis.port, db=config.redis.db)
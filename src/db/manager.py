@@ -1,18 +1,53 @@
-import math
+import sys
 
 from .models import User, Chat, ChatLink
 
 from typing import Literal
 
-from sqlalchemy import select, update, func, asc
+from sqlalchemy import select, update, func, asc, desc, text
+from sqlalchemy.sql import ColumnElement, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.engine.row import Row
+from sqlalchemy.orm import aliased
+
+# Канал LISTEN/NOTIFY, по которому процессы бота узнают об изменении маршрутизации групп
+ROUTING_CHANNEL = "subcheckbot_routing"
+
+
+def username_prefix_filter(prefix: str) -> tuple[ColumnElement, ...]:
+    """Условия "username начинается с prefix" без учета регистра.
+
+    Сравнение в байтовом порядке (~>=~, ~<~) напрямую покрывается индексом
+    ix_users_username_prefix (text_pattern_ops) из 0006, в том числе в обобщенном
+    плане подготовленного запроса, где LIKE 'prefix%' в диапазон не раскрывается.
+    """
+
+    prefix = prefix.lower()
+    username = func.lower(User.username)
+    conditions = [username.op("~>=~")(prefix)]
+
+    # UTF-8 сохраняет порядок символов, поэтому строки с префиксом лежат строго до
+    # префикса с увеличенным последним символом
+    last = ord(prefix[-1])
+    if last < sys.maxunicode:
+        # Суррогаты в UTF-8 не кодируются, следующий за ними символ - U+E000
+        upper = 0xE000 if last == 0xD7FF else last + 1
+        conditions.append(username.op("~<~")(prefix[:-1] + chr(upper)))
+    else:
+        conditions.append(username.startswith(prefix, autoescape=True))
+
+    return tuple(conditions)
 
 
 class DBManager:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    async def notify_routing(self, payload: str) -> None:
+        """Уведомление доставляется слушателям после коммита транзакции"""
+
+        await self.session.execute(select(func.pg_notify(ROUTING_CHANNEL, payload)))
+
     async def add_user(self, chat_id: int, username: str, status: bool = True) -> User:
         user = User(chat_id=chat_id, username=username, status=status)
         self.session.add(user)
@@ -43,18 +78,64 @@ class DBManager:
     async def update_user(self, uid: int, status: bool) -> User:
         user = await self.get_user(uid=uid, for_update=True)
 
-        stmt = update(User).values(status=status).where(User.id == user.id).returning(User)
-        updated_user: User = (await self.session.execute(stmt)).scalars().one()
+        # ORM-update синхронизирует загруженный объект user, а returning(User) в
+        # SQLAlchemy 1.4 вернул бы только id
+        stmt = update(User).values(status=status).where(User.id == user.id)
+        await self.session.execute(stmt)
+        await self.notify_routing(f"user:{user.id}")
+
+        return user
+
+    async def get_users_page(
+        self,
+        after_id: int = 0,
+        limit: int = 1000,
+        status: bool | None = None,
+        before_id: int | None = None,
+        username_prefix: str | None = None,
+    ) -> list[Row]:
+        """Страница пользователей по id (keyset, без OFFSET).
+
+        Пользователи идут по возрастанию id: следующие после after_id или, если задан
+        before_id, последние limit перед ним. Если перед before_id пользователей меньше
+        limit, страница дополняется пользователями начиная с before_id.
+        """
 
-        return updated_user
+        stmt = select(User.id, User.chat_id, User.username, User.status)
 
-    async def get_users(self, page_number: int = 1, limit: int = 10) -> tuple[list[User], int]:
-        stmt = select(User).offset((page_number - 1) * limit).limit(limit)
-        users: list[User] = (await self.session.execute(stmt)).scalars().all()
-        users_count = (await self.session.execute(select(func.count()).select_from(User))).scalar()
-        total_pages = math.ceil(users_count / limit)
+        if status is not None:
+            stmt = stmt.where(User.status.is_(status))
+        if username_prefix:
+            stmt = stmt.where(*username_prefix_filter(username_prefix))
 
-        return users, total_pages
+        if before_id is None:
+            stmt_after = stmt.where(User.id > after_id).order_by(asc(User.id)).limit(limit)
+            users: list[Row] = (await self.session.execute(stmt_after)).all()
+            return users
+
+        stmt_before = stmt.where(User.id < before_id).order_by(desc(User.id)).limit(limit)
+        users = (await self.session.execute(stmt_before)).all()[::-1]
+
+        if len(users) < limit:
+            stmt_refill = stmt.where(User.id >= before_id).order_by(asc(User.id))
+            stmt_refill = stmt_refill.limit(limit - len(users))
+            users += (await self.session.execute(stmt_refill)).all()
+
+        return users
+
+    async def count_users(self) -> int:
+        count: int = (await self.session.execute(select(func.count()).select_from(User))).scalar()
+        return count
+
+    async def estimate_users_count(self) -> int:
+        """Оценка числа пользователей из статистики планировщика, без чтения таблицы"""
+
+        stmt = text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = 'processing.users'::regclass"
+        )
+        count: int = (await self.session.execute(stmt)).scalar()
+        # -1 - статистика еще не собиралась
+        return max(count, 0)
 
     async def get_chat(self, pk_id: int | None = None, chat_id: int | None = None) -> Row:
         stmt = (
@@ -66,6 +147,8 @@ class DBManager:
                 Chat.title,
                 Chat.creation_date,
                 Chat.status,
+                Chat.enforcement_mode,
+                Chat.health,
                 func.coalesce(ChatLink.target_chat_id, None).label("target_chat_id"),
             )
             .outerjoin(ChatLink, ChatLink.checked_chat_id == Chat.id)
@@ -79,32 +162,137 @@ class DBManager:
 
         return (await self.session.execute(stmt)).first()
 
+    @staticmethod
+    def _group_routes_stmt() -> Select:
+        checked = aliased(Chat)
+        return (
+            select(
+                Chat.id,
+                Chat.uid,
+                Chat.chat_id,
+                Chat.title,
+                Chat.enforcement_mode,
+                Chat.health,
+                User.status.label("owner_status"),
+                checked.id.label("checked_id"),
+                checked.chat_id.label("checked_chat_id"),
+                checked.title.label("checked_title"),
+                checked.username.label("checked_username"),
+                checked.invite_link.label("checked_invite_link"),
+                checked.health.label("checked_health"),
+            )
+            .join(User, User.id == Chat.uid)
+            .outerjoin(ChatLink, ChatLink.target_chat_id == Chat.id)
+            .outerjoin(checked, checked.id == ChatLink.checked_chat_id)
+            .where(Chat.type == "group")
+            .order_by(asc(Chat.id))
+        )
+
+    async def get_group_routes(
+        self, group_ids: list[int] | None = None, user_id: int | None = None
+    ) -> list[Row]:
+        """Группы со статусом владельца и проверяемыми каналами, по строке на привязку"""
+
+        stmt = self._group_routes_stmt()
+
+        if group_ids is not None:
+            stmt = stmt.where(Chat.id.in_(group_ids))
+        if user_id:
+            stmt = stmt.where(Chat.uid == user_id)
+
+        rows: list[Row] = (await self.session.execute(stmt)).all()
+        return rows
+
+    async def get_enforcement_context(self, chat_id: int) -> list[Row]:
+        """Группа, статус ее владельца и все проверяемые каналы за один запрос.
+
+        Строк столько, сколько у группы привязок (одна с пустыми checked_* полями, если
+        привязок нет). Текст запроса не меняется, поэтому asyncpg-диалект SQLAlchemy
+        держит его подготовленным в кэше соединения и повторно не планирует.
+        """
+
+        stmt = self._group_routes_stmt().where(Chat.chat_id == chat_id)
+
+        rows: list[Row] = (await self.session.execute(stmt)).all()
+        return rows
+
     async def get_chats(
-        self, user_id: int | None = None, chat_type: Literal["group", "channel"] | None = None
+        self,
+        user_id: int | None = None,
+        chat_type: Literal["group", "channel"] | None = None,
+        chat_id: int | None = None,
     ) -> list[Chat]:
         stmt = select(Chat)
 
         if user_id:
             stmt = stmt.filter_by(uid=user_id)
+        if chat_id:
+            stmt = stmt.filter_by(chat_id=chat_id)
         if chat_type:
             stmt = stmt.filter_by(type=chat_type)
 
         chats: list[Chat] = (await self.session.execute(stmt)).scalars().all()
         return chats
 
+    async def get_chats_page(self, after_id: int = 0, limit: int = 100) -> list[Chat]:
+        stmt = select(Chat).where(Chat.id > after_id).order_by(asc(Chat.id)).limit(limit)
+
+        chats: list[Chat] = (await self.session.execute(stmt)).scalars().all()
+        return chats
+
     async def add_chat(
-        self, title: str, chat_id: int, user_id: int, chat_type: Literal["group", "channel"]
+        self,
+        title: str,
+        chat_id: int,
+        user_id: int,
+        chat_type: Literal["group", "channel"],
+        username: str | None = None,
+        invite_link: str | None = None,
     ) -> Chat:
-        chat = Chat(title=title, chat_id=chat_id, uid=user_id, type=chat_type)
+        chat = Chat(
+            title=title,
+            chat_id=chat_id,
+            uid=user_id,
+            type=chat_type,
+            username=username,
+            invite_link=invite_link,
+        )
         self.session.add(chat)
         await self.session.flush()
+        await self.notify_routing(f"chat:{chat.id}")
 
         return chat
 
+    async def count_chats(self) -> int:
+        count: int = (await self.session.execute(select(func.count()).select_from(Chat))).scalar()
+        return count
+
+    async def update_chat_info(
+        self, pk_id: int, title: str | None, username: str | None, invite_link: str | None
+    ) -> None:
+        stmt = (
+            update(Chat)
+            .values(title=title, username=username, invite_link=invite_link)
+            .where(Chat.id == pk_id)
+        )
+        await self.session.execute(stmt)
+        await self.notify_routing(f"chat:{pk_id}")
+
+    async def set_chat_health(self, pk_id: int, health: str) -> None:
+        stmt = update(Chat).values(health=health).where(Chat.id == pk_id)
+        await self.session.execute(stmt)
+        await self.notify_routing(f"chat:{pk_id}")
+
+    async def set_enforcement_mode(self, pk_id: int, mode: str) -> None:
+        stmt = update(Chat).values(enforcement_mode=mode).where(Chat.id == pk_id)
+        await self.session.execute(stmt)
+        await self.notify_routing(f"chat:{pk_id}")
+
     async def delete_chat(self, pk_id: int) -> Chat:
         chat: Chat = await self.session.get(Chat, pk_id)
         await self.session.delete(chat)
         await self.session.flush()
+        await self.notify_routing(f"chat:{pk_id}")
         return chat
 
     async def get_linked_chats(self, target_chat_id: int) -> list[Chat]:
@@ -142,6 +330,7 @@ class DBManager:
         )
         self.session.add(chat_link)
         await self.session.flush()
+        await self.notify_routing(f"link:{target_chat_id}")
 
         return chat_link
 
@@ -153,5 +342,6 @@ class DBManager:
         chat_link: ChatLink = (await self.session.execute(stmt)).scalars().one()
         await self.session.delete(chat_link)
         await self.session.flush()
+        await self.notify_routing(f"link:{target_chat_id}")
 
         return chat_link
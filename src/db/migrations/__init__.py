@@ -0,0 +1,119 @@
+import re
+from pathlib import Path
+
+import asyncpg
+from loguru import logger
+
+from settings import config
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+
+# Миграции, которые нельзя выполнять в транзакции (например, CREATE INDEX CONCURRENTLY),
+# начинаются с этой строки и выполняются по одному выражению
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+
+# Ключ advisory lock, чтобы миграции не выполнялись одновременно из нескольких контейнеров
+LOCK_KEY = 7_302_114_001
+
+
+# Имя индекса и схема таблицы в CREATE INDEX CONCURRENTLY
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)"
+    r"\s+ON\s+(?:ONLY\s+)?(?:(\w+)\.)?\w+",
+    re.IGNORECASE,
+)
+
+
+def get_migrations() -> list[tuple[str, str]]:
+    return [(path.stem, path.read_text()) for path in sorted(VERSIONS_DIR.glob("*.sql"))]
+
+
+def split_statements(sql: str) -> list[str]:
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def get_concurrent_index(statement: str) -> str | None:
+    """Имя со схемой индекса, который выражение строит CONCURRENTLY"""
+
+    match = CONCURRENT_INDEX_RE.search(statement)
+    if match is None:
+        return None
+    name, schema = match.groups()
+    return f"{schema or 'public'}.{name}"
+
+
+async def is_invalid_index(conn: asyncpg.Connection, index: str) -> bool:
+    """Индекс есть, но помечен INVALID (его построение CONCURRENTLY прервалось)"""
+
+    return bool(
+        await conn.fetchval(
+            "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index
+        )
+    )
+
+
+async def run_no_transaction(conn: asyncpg.Connection, sql: str) -> None:
+    """Выполняет миграцию без транзакции по одному выражению.
+
+    Прерванный CREATE INDEX CONCURRENTLY оставляет INVALID индекс, который IF NOT EXISTS
+    при повторном запуске пропустил бы. Такой индекс удаляется и строится заново, а
+    версия не записывается, пока хоть один индекс миграции невалиден.
+    """
+
+    indexes = []
+    for statement in split_statements(sql):
+        index = get_concurrent_index(statement)
+        if index is not None:
+            indexes.append(index)
+            if await is_invalid_index(conn, index):
+                logger.warning(f"Dropping invalid index | {index=}")
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+        await conn.execute(statement)
+
+    for index in indexes:
+        if await is_invalid_index(conn, index):
+            raise RuntimeError(f"Index {index} is invalid after migration")
+
+
+async def run_migrations() -> None:
+    """Применяет еще не примененные миграции из versions по порядку имен файлов"""
+
+    conn = await asyncpg.connect(config.db.dsn)
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1)", LOCK_KEY)
+
+        await conn.execute(
+            "CREATE SCHEMA IF NOT EXISTS processing;"
+            "CREATE TABLE IF NOT EXISTS processing.schema_migrations ("
+            "    version VARCHAR PRIMARY KEY,"
+            "    applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()"
+            ")"
+        )
+        applied = {
+            row["version"]
+            for row in await conn.fetch("SELECT version FROM processing.schema_migrations")
+        }
+
+        for version, sql in get_migrations():
+            if version in applied:
+                continue
+
+            logger.info(f"Applying migration | {version=}")
+
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                await run_no_transaction(conn, sql)
+                await conn.execute(
+                    "INSERT INTO processing.schema_migrations (version) VALUES ($1)", version
+                )
+            else:
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO processing.schema_migrations (version) VALUES ($1)", version
+                    )
+
+            logger.success(f"Migration applied | {version=}")
+    finally:
+        await conn.close()
@@ -0,0 +1,37 @@
+-- Исходная схема, которую раньше создавал db.create_tables через create_all.
+-- На уже развернутых базах ничего не меняет.
+CREATE SCHEMA IF NOT EXISTS processing;
+
+CREATE TABLE IF NOT EXISTS processing.users (
+    id SERIAL NOT NULL,
+    chat_id BIGINT NOT NULL,
+    username VARCHAR,
+    roles VARCHAR[] DEFAULT ARRAY['USER']::text[],
+    creation_date TIMESTAMP WITHOUT TIME ZONE,
+    status BOOLEAN,
+    PRIMARY KEY (id),
+    UNIQUE (chat_id)
+);
+
+CREATE TABLE IF NOT EXISTS processing.chats (
+    id SERIAL NOT NULL,
+    uid INTEGER NOT NULL,
+    chat_id BIGINT NOT NULL,
+    title VARCHAR,
+    creation_date TIMESTAMP WITHOUT TIME ZONE,
+    status BOOLEAN,
+    type VARCHAR,
+    PRIMARY KEY (id),
+    CONSTRAINT uid_chatid_unique UNIQUE (uid, chat_id),
+    FOREIGN KEY (uid) REFERENCES processing.users (id)
+);
+
+CREATE TABLE IF NOT EXISTS processing.chat_links (
+    id SERIAL NOT NULL,
+    target_chat_id INTEGER NOT NULL,
+    checked_chat_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT chat_link_unique UNIQUE (target_chat_id, checked_chat_id),
+    FOREIGN KEY (target_chat_id) REFERENCES processing.chats (id),
+    FOREIGN KEY (checked_chat_id) REFERENCES processing.chats (id)
+);
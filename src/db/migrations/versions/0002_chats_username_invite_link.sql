@@ -0,0 +1,3 @@
+-- username и ссылка-приглашение канала/чата для кнопок подписки
+ALTER TABLE processing.chats ADD COLUMN IF NOT EXISTS username VARCHAR;
+ALTER TABLE processing.chats ADD COLUMN IF NOT EXISTS invite_link VARCHAR;
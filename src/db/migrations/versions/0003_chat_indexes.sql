@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Индексы строятся CONCURRENTLY, чтобы не блокировать запись в работающей базе.
+-- chats(chat_id): DBManager.get_chat / get_chats / get_enforcement_context по chat_id.
+-- chat_links(checked_chat_id): соединения по checked_chat_id в get_chat и get_linked_chats,
+-- target_chat_id уже покрыт уникальным индексом chat_link_unique.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chats_chat_id ON processing.chats (chat_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_links_checked_chat_id ON processing.chat_links (checked_chat_id);
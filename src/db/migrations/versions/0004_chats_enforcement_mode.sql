@@ -0,0 +1,3 @@
+-- Режим модерации группы: delete - удалять сообщения неподписчиков,
+-- restrict - ограничивать неподписчика на время и удалять только первое сообщение
+ALTER TABLE processing.chats ADD COLUMN IF NOT EXISTS enforcement_mode VARCHAR NOT NULL DEFAULT 'delete';
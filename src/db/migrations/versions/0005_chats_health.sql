@@ -0,0 +1,3 @@
+-- Доступность чата для бота, которую проставляет фоновая проверка:
+-- ok, bot_missing - бота нет в чате, no_rights - бот не администратор или без нужных прав
+ALTER TABLE processing.chats ADD COLUMN IF NOT EXISTS health VARCHAR NOT NULL DEFAULT 'ok';
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Поиск пользователей по началу имени в меню администратора (DBManager.get_users_page):
+-- lower(username) LIKE 'prefix%' использует btree индекс только с text_pattern_ops.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_prefix ON processing.users (lower(username) text_pattern_ops);
@@ -10,11 +10,12 @@ from sqlalchemy import (
     BigInteger,
     Boolean,
     UniqueConstraint,
+    Index,
     ARRAY,
     text,
 )
 
-from bot.schemas.general import UserRoles
+from bot.schemas.general import UserRoles, EnforcementMode, ChatHealth
 
 
 Base = declarative_base()
@@ -36,6 +37,7 @@ class Chat(Base):  # type: ignore
     __tablename__ = "chats"
     __table_args__ = (
         UniqueConstraint("uid", "chat_id", name="uid_chatid_unique"),
+        Index("ix_chats_chat_id", "chat_id"),
         {"schema": "processing"},
     )
 
@@ -43,15 +45,27 @@ class Chat(Base):  # type: ignore
     uid = Column(ForeignKey(User.id), nullable=False)
     chat_id = Column(BigInteger, nullable=False)
     title = Column(String)
+    username = Column(String)
+    invite_link = Column(String)
     creation_date = Column(DateTime, default=datetime.utcnow)
     status = Column(Boolean, default=True)
     type = Column(String, default="group")
+    enforcement_mode = Column(
+        String,
+        nullable=False,
+        default=EnforcementMode.DELETE.value,
+        server_default=EnforcementMode.DELETE.value,
+    )
+    health = Column(
+        String, nullable=False, default=ChatHealth.OK.value, server_default=ChatHealth.OK.value
+    )
 
 
 class ChatLink(Base):  # type: ignore
     __tablename__ = "chat_links"
     __table_args__ = (
         UniqueConstraint("target_chat_id", "checked_chat_id", name="chat_link_unique"),
+        Index("ix_chat_links_checked_chat_id", "checked_chat_id"),
         {"schema": "processing"},
     )
 
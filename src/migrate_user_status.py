@@ -0,0 +1,29 @@
+import argparse
+import asyncio
+
+from bot.services.user_status import migrate_hashes_to_set
+from settings import config
+
+
+async def main(batch: int, delete: bool) -> None:
+    report = await migrate_hashes_to_set(batch=batch, delete=delete)
+
+    hashes_mb = report["hashes_bytes"] / 1024 / 1024
+    set_mb = report["set_bytes"] / 1024 / 1024
+    print(f"User hashes:   {report['hashes']} keys, {hashes_mb:.2f} MB")
+    print(
+        f"Blocked users: {report['blocked']} in {config.auth_cache.blocked_key}, {set_mb:.2f} MB"
+    )
+    if not delete:
+        print("Hashes are kept, run with --delete-hashes to remove them")
+    print("Set AUTH_CACHE__STORAGE=set to read statuses from the set")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Перенос статусов пользователей из хэшей Redis в множество заблокированных"
+    )
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--delete-hashes", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch, args.delete_hashes))
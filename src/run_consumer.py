@@ -0,0 +1,32 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+from bot.bot import bot, dp
+from bot.services.bus import BusConsumer
+from prometheus_client import start_http_server
+from settings import config
+
+
+async def run_consumer() -> None:
+    if config.bus.metrics_port:
+        start_http_server(config.bus.metrics_port)
+
+    consumer = asyncio.create_task(BusConsumer(name=f"{socket.gethostname()}:{os.getpid()}").run())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, consumer.cancel)
+
+    await dp.emit_startup(bot=bot)
+    try:
+        await consumer
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(run_consumer())
@@ -2,11 +2,16 @@ import asyncio
 import logging
 import sys
 from bot.bot import bot, dp
+from bot.services.bus import poll_to_bus
+from settings import config
 
 
 async def run_polling() -> None:
     await bot.delete_webhook()
-    await dp.start_polling(bot)
+    if config.ingress.mode == "bus":
+        await poll_to_bus()
+    else:
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
 if __name__ == "__main__":
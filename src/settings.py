@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, model_validator, BaseModel
@@ -78,6 +78,8 @@ class DBConfig(BaseModel):
     host: Optional[str] = Field(default="localhost")
     port: Optional[int] = Field(default=5432)
     database: str
+    pool_size: int = Field(default=5, gt=0)
+    max_overflow: int = Field(default=10, ge=0)
 
     @property
     def url(self) -> str:
@@ -85,10 +87,233 @@ class DBConfig(BaseModel):
             f"{self.engine}://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
         )
 
+    @property
+    def dsn(self) -> str:
+        """Адрес для прямого подключения через asyncpg"""
+
+        return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+
+
+class AuthCacheConfig(BaseModel):
+    """Конфиг кэша статусов пользователей в памяти процесса (перед Redis).
+
+    storage - как статусы хранятся в Redis: hash - хэш на пользователя (redis.prefix),
+    set - одно множество chat_id заблокированных пользователей (blocked_key).
+    """
+
+    turned_on: Optional[bool] = Field(default=True)
+    storage: Literal["hash", "set"] = Field(default="hash")
+    blocked_key: str = Field(default="subchecker:bot:blocked_users")
+    channel: str = Field(default="subchecker:bot:user_status")
+    local_ttl: int = Field(default=5 * 60, gt=0)
+    lru_size: int = Field(default=10_000, gt=0)
+    warm_up_batch: int = Field(default=1000, gt=0)
+    reconnect_delay: int = Field(default=5, gt=0)
+
+
+class UsersListConfig(BaseModel):
+    """Конфиг списка пользователей в меню администратора (число пользователей
+    пересчитывается в фоне раз в count_interval секунд)"""
+
+    page_size: int = Field(default=10, gt=0, le=50)
+    count_interval: int = Field(default=5 * 60, gt=0)
+
+
+class MembershipCacheConfig(BaseModel):
+    """Конфиг кэша подписок пользователей на проверяемые каналы.
+
+    Индекс подписчиков канала из chat_member апдейтов живет index_ttl секунд после
+    последнего апдейта (не меньше TTL записей кэша) и сбрасывается целиком, если в нем
+    больше index_max_size пользователей.
+    """
+
+    turned_on: Optional[bool] = Field(default=True)
+    prefix: str = Field(default="subchecker:bot:membership")
+    positive_ttl: int = Field(default=600, gt=0)
+    negative_ttl: int = Field(default=60, gt=0)
+    index_ttl: int = Field(default=24 * 60 * 60, gt=0)
+    index_max_size: int = Field(default=100_000, gt=0)
+
+
+class FanOutConfig(BaseModel):
+    """Конфиг ограничения параллельных проверок подписок"""
+
+    global_limit: int = Field(default=50, gt=0)
+    per_group_limit: int = Field(default=5, gt=0)
+
+
+class ChatSyncConfig(BaseModel):
+    """Конфиг фоновой проверки чатов: доступность для бота, названия и ссылки"""
+
+    turned_on: Optional[bool] = Field(default=True)
+    interval: int = Field(default=6 * 60 * 60, gt=0)
+    batch_size: int = Field(default=100, gt=0)
+    rate: float = Field(default=1.0, gt=0)
+
+
+class RoutingConfig(BaseModel):
+    """Конфиг снимка маршрутизации групп в памяти процесса"""
+
+    turned_on: Optional[bool] = Field(default=True)
+    reconnect_delay: int = Field(default=5, gt=0)
+
+
+class UnregisteredConfig(BaseModel):
+    """Конфиг негативного кэша групп, не добавленных в бота.
+
+    leave_after - через сколько секунд с первого сообщения бот выходит из такой группы,
+    0 - не выходить.
+    """
+
+    turned_on: Optional[bool] = Field(default=True)
+    prefix: str = Field(default="subchecker:bot:unregistered")
+    ttl: int = Field(default=5 * 60, gt=0)
+    local_ttl: int = Field(default=30, gt=0)
+    lru_size: int = Field(default=10_000, gt=0)
+    leave_after: int = Field(default=0, ge=0)
+
+
+class OutboundConfig(BaseModel):
+    """Конфиг планировщика исходящих запросов в Bot API (лимиты на процесс).
+
+    max_chat_wait - сколько секунд сообщение может ждать лимита группы, иначе оно не
+    отправляется.
+    """
+
+    turned_on: Optional[bool] = Field(default=True)
+    global_rate: float = Field(default=30, gt=0)
+    chat_rate_per_minute: float = Field(default=20, gt=0)
+    max_retries: int = Field(default=3, ge=0)
+    max_chat_wait: float = Field(default=5, ge=0)
+
+
+class DeletionConfig(BaseModel):
+    """Конфиг пакетного удаления сообщений"""
+
+    window: float = Field(default=0.5, ge=0)
+
+
+class WarningsConfig(BaseModel):
+    """Конфиг предупреждений о подписке.
+
+    Пока не прошел cooldown, новые сообщения пользователя удаляются без нового
+    предупреждения. lifetime - через сколько секунд удалять предупреждение, 0 - не удалять.
+    Если lifetime больше cooldown, новое предупреждение не отправляется, пока не удалено
+    предыдущее.
+    """
+
+    prefix: str = Field(default="subchecker:bot:warning")
+    cooldown: int = Field(default=60, gt=0)
+    lifetime: int = Field(default=120, ge=0)
+
+
+class RestrictionsConfig(BaseModel):
+    """Конфиг режима ограничения неподписчиков.
+
+    window - на сколько секунд ограничивать и сколько не пытаться снова ограничить
+    пользователя, которого ограничить не удалось (его сообщения просто удаляются).
+    """
+
+    prefix: str = Field(default="subchecker:bot:restricted")
+    window: int = Field(default=60 * 60, ge=30)
+
+
+class JoinVerificationConfig(BaseModel):
+    """Конфиг проверки подписок новых участников групп (проверок в секунду на процесс)"""
+
+    turned_on: Optional[bool] = Field(default=True)
+    workers: int = Field(default=2, gt=0)
+    queue_size: int = Field(default=1000, gt=0)
+    rate: float = Field(default=5, gt=0)
+
+
+class BreakerConfig(BaseModel):
+    """Конфиг предохранителя для каналов, к которым бот потерял доступ.
+
+    После failure_threshold ошибок за failure_window секунд запросы к каналу
+    прекращаются на open_timeout секунд, затем выполняется один пробный запрос.
+    """
+
+    prefix: str = Field(default="subchecker:bot:breaker")
+    failure_threshold: int = Field(default=3, gt=0)
+    failure_window: int = Field(default=5 * 60, gt=0)
+    open_timeout: int = Field(default=10 * 60, gt=0)
+    probe_timeout: int = Field(default=60, gt=0)
+    tripped_ttl: int = Field(default=7 * 24 * 60 * 60, gt=0)
+
+
+class MediaGroupConfig(BaseModel):
+    """Конфиг обработки альбомов: сколько секунд собирать части и помнить о предупреждении"""
+
+    window: float = Field(default=1.0, gt=0)
+    ttl: int = Field(default=60, gt=0)
+
+
+class IngressConfig(BaseModel):
+    """Конфиг приема апдейтов.
+
+    inline - апдейт обрабатывается внутри HTTP запроса Telegram, queue - запрос
+    сразу подтверждается, а апдейт обрабатывают воркеры процесса, bus - webhook или
+    polling только пишут апдейты в Redis Streams, обрабатывает их bot-consumer.
+    """
+
+    mode: Literal["inline", "queue", "bus"] = Field(default="inline")
+    workers: int = Field(default=16, gt=0)
+    queue_size: int = Field(default=1000, gt=0)
+
+
+class BusConfig(BaseModel):
+    """Конфиг шины апдейтов в Redis Streams.
+
+    Запись, которую не удалось обработать за max_deliveries доставок, переносится в
+    stream <prefix>:dead. metrics_port - порт /metrics консьюмера, 0 - не открывать.
+    """
+
+    prefix: str = Field(default="subchecker:bot:updates")
+    group: str = Field(default="handlers")
+    partitions: int = Field(default=16, gt=0)
+    maxlen: int = Field(default=100_000, gt=0)
+    batch_size: int = Field(default=10, gt=0)
+    block: int = Field(default=2, gt=0)
+    lease_ttl: int = Field(default=30, gt=0)
+    max_deliveries: int = Field(default=5, gt=0)
+    metrics_port: int = Field(default=9100, ge=0, le=65535)
+
+
+class DedupConfig(BaseModel):
+    """Конфиг защиты от повторной обработки апдейтов.
+
+    processing_ttl - сколько секунд апдейт считается обрабатываемым: если процесс упал,
+    после этого срока повторная доставка обработает апдейт заново.
+    """
+
+    turned_on: Optional[bool] = Field(default=True)
+    prefix: str = Field(default="subchecker:bot:update")
+    ttl: int = Field(default=60 * 60, gt=0)
+    processing_ttl: int = Field(default=60, gt=0)
+    lru_size: int = Field(default=10_000, gt=0)
+
 
 class Config(BaseSettings):
     telegram: TelegramConfig = Field(default_factory=TelegramConfig)  # type: ignore[arg-type]
     redis: RedisConfig = Field(default_factory=RedisConfig)
+    auth_cache: AuthCacheConfig = Field(default_factory=AuthCacheConfig)
+    users_list: UsersListConfig = Field(default_factory=UsersListConfig)
+    membership_cache: MembershipCacheConfig = Field(default_factory=MembershipCacheConfig)
+    fan_out: FanOutConfig = Field(default_factory=FanOutConfig)
+    chat_sync: ChatSyncConfig = Field(default_factory=ChatSyncConfig)
+    routing: RoutingConfig = Field(default_factory=RoutingConfig)
+    unregistered: UnregisteredConfig = Field(default_factory=UnregisteredConfig)
+    outbound: OutboundConfig = Field(default_factory=OutboundConfig)
+    deletion: DeletionConfig = Field(default_factory=DeletionConfig)
+    media_group: MediaGroupConfig = Field(default_factory=MediaGroupConfig)
+    warnings: WarningsConfig = Field(default_factory=WarningsConfig)
+    restrictions: RestrictionsConfig = Field(default_factory=RestrictionsConfig)
+    join_verification: JoinVerificationConfig = Field(default_factory=JoinVerificationConfig)
+    breaker: BreakerConfig = Field(default_factory=BreakerConfig)
+    ingress: IngressConfig = Field(default_factory=IngressConfig)
+    bus: BusConfig = Field(default_factory=BusConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
     sentry: SentryConfig = Field(default_factory=SentryConfig)
     db: DBConfig = Field(default_factory=DBConfig)  # type: ignore[arg-type]
     debug: Optional[bool] = Field(default=False)
@@ -0,0 +1,14 @@
+from celery import Celery
+
+from settings import config
+
+celery_app = Celery(
+    "subcheckbot",
+    broker=config.redis.url,
+    include=["tasks.notifications"],
+)
+celery_app.conf.update(
+    task_ignore_result=True,
+    task_acks_late=True,
+    broker_connection_retry_on_startup=True,
+)
@@ -0,0 +1,53 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from loguru import logger
+from sqlalchemy.exc import NoResultFound
+
+from db import Session, engine
+from db.manager import DBManager
+from settings import config
+
+from . import celery_app
+
+
+async def _notify_channel_unavailable(
+    owner_uid: int, group_title: str | None, channel_title: str | None
+) -> None:
+    # Задача выполняется в своем event loop, поэтому бот и соединения с БД тоже свои
+    bot = Bot(config.telegram.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    try:
+        async with Session() as session:
+            owner = await DBManager(session).get_user(uid=owner_uid)
+
+        await bot.send_message(
+            chat_id=owner.chat_id,
+            text=(
+                f"Бот не может проверить подписки на канал/чат <code>{channel_title}</code>, "
+                f"привязанный к чату <code>{group_title}</code>: бот удален из него или "
+                f"лишен прав администратора. Пока права не вернут, подписка на этот "
+                f"канал/чат в <code>{group_title}</code> не проверяется"
+            ),
+        )
+    finally:
+        await bot.session.close()
+        await engine.dispose()
+
+
+@celery_app.task(  # type: ignore[untyped-decorator]
+    autoretry_for=(TelegramNetworkError, TelegramRetryAfter),
+    retry_backoff=True,
+    max_retries=5,
+)
+def notify_channel_unavailable(
+    owner_uid: int, group_title: str | None, channel_title: str | None
+) -> None:
+    """Сообщает владельцу группы, что бот потерял доступ к проверяемому каналу"""
+
+    try:
+        asyncio.run(_notify_channel_unavailable(owner_uid, group_title, channel_title))
+    except NoResultFound:
+        logger.warning(f"Owner to notify not found | {owner_uid=}")
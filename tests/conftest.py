@@ -0,0 +1,64 @@
+import os
+
+# Конфиг читается при импорте settings, поэтому окружение задается до импорта приложения.
+# Тесты работают с локальным Redis в отдельной базе, которая очищается перед каждым тестом
+os.environ.setdefault("TELEGRAM__BOT_TOKEN", "12345678:" + "A" * 35)
+os.environ.setdefault("DB__USER", "postgres")
+os.environ.setdefault("DB__PASSWORD", "")
+os.environ.setdefault("DB__DATABASE", "postgres")
+os.environ.setdefault("SENTRY__TURNED_ON", "false")
+os.environ.setdefault("REDIS__DB", "15")
+
+from typing import AsyncIterator  # noqa: E402
+
+import pytest  # noqa: E402
+from redis.asyncio import Redis  # noqa: E402
+from redis.exceptions import ConnectionError as RedisConnectionError  # noqa: E402
+from sqlalchemy import delete, text  # noqa: E402
+
+import bot.bot  # noqa: E402, F401 - bot.bot импортируется первым из-за циклических импортов
+from db import Session, engine, rd  # noqa: E402
+from db.models import User  # noqa: E402
+
+# chat_id тестовых пользователей, чтобы не задеть остальные данные локальной БД
+TEST_CHAT_IDS = range(9_000_000_000, 9_000_001_000)
+
+
+@pytest.fixture
+async def redis() -> AsyncIterator[Redis]:
+    try:
+        await rd.ping()
+    except RedisConnectionError:
+        pytest.skip("Redis is not available")
+
+    await rd.flushdb()
+    yield rd
+    await rd.flushdb()
+    # Соединения привязаны к event loop теста
+    await rd.aclose()
+
+
+@pytest.fixture
+async def db() -> AsyncIterator[None]:
+    """Локальный Postgres с примененными миграциями, тестовые пользователи удаляются"""
+
+    async def cleanup() -> None:
+        async with Session() as session, session.begin():
+            await session.execute(
+                delete(User)
+                .where(User.chat_id.between(TEST_CHAT_IDS.start, TEST_CHAT_IDS.stop - 1))
+                .execution_options(synchronize_session=False)
+            )
+
+    try:
+        async with Session() as session:
+            await session.execute(text("SELECT 1 FROM processing.users LIMIT 1"))
+    except Exception:
+        await engine.dispose()
+        pytest.skip("Postgres with applied migrations is not available")
+
+    await cleanup()
+    yield
+    await cleanup()
+    # Соединения пула привязаны к event loop теста
+    await engine.dispose()
@@ -0,0 +1,82 @@
+from typing import Any
+
+import pytest
+from redis.asyncio import Redis
+
+from bot.services import breaker
+from settings import config
+
+CHANNEL = -1001
+
+
+class FakeTask:
+    def __init__(self) -> None:
+        self.calls: list[dict[str, Any]] = []
+
+    def delay(self, **kwargs: Any) -> None:
+        self.calls.append(kwargs)
+
+
+@pytest.fixture
+def notifications(monkeypatch: pytest.MonkeyPatch) -> FakeTask:
+    task = FakeTask()
+    monkeypatch.setattr(breaker, "notify_channel_unavailable", task)
+    return task
+
+
+async def trip() -> None:
+    for _ in range(config.breaker.failure_threshold - 1):
+        assert not await breaker.record_failure(CHANNEL)
+    assert await breaker.record_failure(CHANNEL)
+
+
+async def end_open_timeout(redis: Redis) -> None:
+    await redis.delete(breaker._key("open", CHANNEL))
+
+
+async def test_opens_after_threshold(redis: Redis) -> None:
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "closed"}
+
+    await trip()
+
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "open"}
+
+
+async def test_single_probe_after_open_timeout(redis: Redis) -> None:
+    await trip()
+    await end_open_timeout(redis)
+
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "probe"}
+    # Остальные вызывающие ждут результата пробного запроса
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "open"}
+
+
+async def test_failed_probe_reopens_and_success_closes(redis: Redis) -> None:
+    await trip()
+    await end_open_timeout(redis)
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "probe"}
+
+    # Уже сработавший предохранитель размыкается с первой ошибки
+    assert await breaker.record_failure(CHANNEL)
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "open"}
+
+    await end_open_timeout(redis)
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "probe"}
+    await breaker.record_success(CHANNEL)
+
+    assert await breaker.get_states([CHANNEL]) == {CHANNEL: "closed"}
+    assert not await redis.keys(f"{config.breaker.prefix}:*")
+
+
+async def test_owner_is_notified_once_per_trip(redis: Redis, notifications: FakeTask) -> None:
+    await trip()
+    for _ in range(2):
+        await breaker.notify_owner(CHANNEL, owner_uid=7, group_title="g", channel_title="c")
+    await breaker.notify_owner(CHANNEL, owner_uid=8, group_title="g", channel_title="c")
+    assert [call["owner_uid"] for call in notifications.calls] == [7, 8]
+
+    # Новое срабатывание после восстановления канала уведомляет заново
+    await breaker.record_success(CHANNEL)
+    await trip()
+    await breaker.notify_owner(CHANNEL, owner_uid=7, group_title="g", channel_title="c")
+    assert [call["owner_uid"] for call in notifications.calls] == [7, 8, 7]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+
+import pytest
+from aiogram import Dispatcher
+from aiogram.types import Message, Update
+from redis.asyncio import Redis
+
+from bot.middlewares.dedup import UpdateDeduplicationMiddleware
+from bot.services import bus, ingress
+from settings import config
+
+
+def make_update(update_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000,
+                "chat": {"id": 42, "type": "private", "first_name": "Ivan"},
+                "from": {"id": 42, "is_bot": False, "first_name": "Ivan"},
+                "text": text,
+            },
+        }
+    )
+
+
+async def wait_for(condition: Callable[[], Awaitable[bool]], timeout: float = 15) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition was not met in time"
+        await asyncio.sleep(0.1)
+
+
+@pytest.fixture
+def handled(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, bool]]:
+    """Диспетчер консьюмера с обработчиком, который падает на тексте "poison" """
+
+    monkeypatch.setattr(config.bus, "prefix", "test:bus")
+    monkeypatch.setattr(config.bus, "partitions", 1)
+    monkeypatch.setattr(config.bus, "block", 1)
+    monkeypatch.setattr(config.bus, "lease_ttl", 3)
+    monkeypatch.setattr(config.bus, "max_deliveries", 3)
+
+    calls: list[tuple[str, bool]] = []
+    dispatcher = Dispatcher()
+    dispatcher.update.outer_middleware(UpdateDeduplicationMiddleware())
+
+    @dispatcher.message()
+    async def handler(message: Message, redelivered: bool = False) -> None:
+        assert message.text is not None
+        calls.append((message.text, redelivered))
+        if message.text == "poison":
+            raise RuntimeError("handler failed")
+
+    monkeypatch.setattr(ingress, "dp", dispatcher)
+    return calls
+
+
+async def run_consumer(redis: Redis, condition: Callable[[], Awaitable[bool]]) -> None:
+    task = asyncio.create_task(bus.BusConsumer(name="test").run())
+    try:
+        await wait_for(condition)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def pending_count(redis: Redis) -> int:
+    info: dict[str, Any] = await redis.xpending(bus._stream_key(0), config.bus.group)
+    return int(info["pending"])
+
+
+async def test_failing_handler_is_retried_and_dead_lettered(
+    redis: Redis, handled: list[tuple[str, bool]]
+) -> None:
+    for update_id, text in enumerate(("first", "poison", "last"), start=1):
+        await bus.publish(make_update(update_id, text))
+
+    async def last_handled() -> bool:
+        return any(text == "last" for text, _ in handled)
+
+    await run_consumer(redis, last_handled)
+
+    # Запись повторяется, пока не исчерпает max_deliveries, и следующие ее не обгоняют.
+    # Следующая запись, прочитанная вместе с ней, в dead stream не попадает
+    assert handled == [
+        ("first", False),
+        ("poison", False),
+        *[("poison", True)] * (config.bus.max_deliveries - 1),
+        ("last", True),
+    ]
+
+    dead = await redis.xrange(bus._dead_key())
+    assert len(dead) == 1
+    assert json.loads(dead[0][1][b"update"])["message"]["text"] == "poison"
+    assert await pending_count(redis) == 0
+
+
+async def test_entries_of_dead_consumer_are_reclaimed(
+    redis: Redis, handled: list[tuple[str, bool]]
+) -> None:
+    await bus.BusConsumer(name="test")._create_groups()
+    await bus.publish(make_update(1, "orphan"))
+    # Консьюмер прочитал запись и упал, не подтвердив ее
+    await redis.xreadgroup(config.bus.group, "dead", {bus._stream_key(0): ">"})
+    assert await pending_count(redis) == 1
+
+    async def acked() -> bool:
+        return bool(handled) and await pending_count(redis) == 0
+
+    await run_consumer(redis, acked)
+
+    assert handled == [("orphan", True)]
+    assert await redis.xrange(bus._dead_key()) == []
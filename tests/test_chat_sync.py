@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import GetChatMember
+from aiogram.types import ChatMemberAdministrator, User
+
+from bot.bot import bot
+from bot.schemas.general import ChatHealth, EnforcementMode
+from bot.services import chat_sync
+
+BOT_USER = User(id=1, is_bot=True, first_name="bot")
+
+
+def make_admin(**rights: bool) -> ChatMemberAdministrator:
+    fields = {
+        "can_be_edited": False,
+        "is_anonymous": False,
+        "can_manage_chat": True,
+        "can_delete_messages": True,
+        "can_manage_video_chats": False,
+        "can_restrict_members": True,
+        "can_promote_members": False,
+        "can_change_info": False,
+        "can_invite_users": True,
+        "can_post_stories": False,
+        "can_edit_stories": False,
+        "can_delete_stories": False,
+    }
+    return ChatMemberAdministrator(user=BOT_USER, **{**fields, **rights})
+
+
+def test_restrict_mode_needs_restrict_right() -> None:
+    admin = make_admin(can_restrict_members=False)
+
+    assert chat_sync.get_member_health(admin, "group") == ChatHealth.OK
+    assert (
+        chat_sync.get_member_health(admin, "group", EnforcementMode.RESTRICT)
+        == ChatHealth.NO_RIGHTS
+    )
+    assert chat_sync.get_member_health(make_admin(), "group", EnforcementMode.RESTRICT) == (
+        ChatHealth.OK
+    )
+
+
+@pytest.mark.parametrize(
+    ("error", "message", "expected"),
+    [
+        (TelegramBadRequest, "Bad Request: chat not found", ChatHealth.BOT_MISSING),
+        (
+            TelegramForbiddenError,
+            "Forbidden: bot was kicked from the group",
+            ChatHealth.BOT_MISSING,
+        ),
+        (TelegramBadRequest, "Bad Request: PARTICIPANT_ID_INVALID", None),
+    ],
+)
+async def test_only_missing_bot_errors_mark_chat_missing(
+    monkeypatch: pytest.MonkeyPatch,
+    error: type[TelegramBadRequest | TelegramForbiddenError],
+    message: str,
+    expected: ChatHealth | None,
+) -> None:
+    async def get_chat_member(**kwargs: Any) -> Any:
+        raise error(GetChatMember(chat_id=-1, user_id=1), message)
+
+    monkeypatch.setattr(bot, "get_chat_member", get_chat_member)
+    chat: Any = SimpleNamespace(
+        id=1, chat_id=-1, type="group", enforcement_mode=EnforcementMode.DELETE
+    )
+
+    assert await chat_sync.check_chat_health(chat) == expected
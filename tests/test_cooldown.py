@@ -0,0 +1,52 @@
+import pytest
+from redis.asyncio import Redis
+
+from bot import metrics
+from bot.services import cooldown, deletion
+from settings import config
+
+
+def warnings_count(result: str) -> float:
+    value: float = metrics.warnings.labels(result=result)._value.get()
+    return value
+
+
+async def test_warning_is_claimed_once_until_released(redis: Redis) -> None:
+    suppressed = warnings_count("suppressed")
+
+    assert await cooldown.claim_warning(chat_id=-100, user_id=1)
+    assert not await cooldown.claim_warning(chat_id=-100, user_id=1)
+    assert await cooldown.claim_warning(chat_id=-100, user_id=2)
+    assert warnings_count("suppressed") == suppressed + 1
+
+    await cooldown.release_warning(chat_id=-100, user_id=1)
+    assert await cooldown.claim_warning(chat_id=-100, user_id=1)
+
+
+async def test_cooldown_lasts_while_warning_is_visible(
+    redis: Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.warnings, "cooldown", 60)
+    monkeypatch.setattr(config.warnings, "lifetime", 120)
+    sent = warnings_count("sent")
+
+    await cooldown.claim_warning(chat_id=-100, user_id=1)
+    await redis.expire(cooldown._warning_key(-100, 1), 10)
+    await cooldown.remember_warning(chat_id=-100, user_id=1, message_id=77)
+
+    assert 110 < await redis.ttl(cooldown._warning_key(-100, 1)) <= 120
+    assert await redis.zscore(deletion.SCHEDULE_KEY, "-100:77") is not None
+    assert warnings_count("sent") == sent + 1
+
+
+async def test_warning_without_lifetime_uses_cooldown(
+    redis: Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.warnings, "cooldown", 60)
+    monkeypatch.setattr(config.warnings, "lifetime", 0)
+
+    await cooldown.claim_warning(chat_id=-100, user_id=1)
+    await cooldown.remember_warning(chat_id=-100, user_id=1, message_id=77)
+
+    assert 50 < await redis.ttl(cooldown._warning_key(-100, 1)) <= 60
+    assert not await redis.exists(deletion.SCHEDULE_KEY)
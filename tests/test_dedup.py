@@ -0,0 +1,70 @@
+from typing import Any
+
+import pytest
+from aiogram.types import TelegramObject, Update
+from redis.asyncio import Redis
+
+from bot.middlewares.dedup import DONE, PROCESSING, UpdateDeduplicationMiddleware
+from settings import config
+
+UPDATE_ID = 1001
+
+
+@pytest.fixture
+def calls() -> list[int]:
+    return []
+
+
+async def deliver(
+    middleware: UpdateDeduplicationMiddleware,
+    calls: list[int],
+    redelivered: bool = False,
+    fail: bool = False,
+) -> None:
+    async def handler(event: TelegramObject, data: dict[str, Any]) -> None:
+        assert isinstance(event, Update)
+        calls.append(event.update_id)
+        if fail:
+            raise RuntimeError("handler failed")
+
+    await middleware(handler, Update(update_id=UPDATE_ID), {"redelivered": redelivered})
+
+
+def mark_key() -> str:
+    return f"{config.dedup.prefix}:{UPDATE_ID}"
+
+
+async def test_done_mark_skips_delivery_to_other_worker(redis: Redis, calls: list[int]) -> None:
+    await deliver(UpdateDeduplicationMiddleware(), calls)
+
+    assert await redis.get(mark_key()) == DONE
+    assert await redis.ttl(mark_key()) > config.dedup.processing_ttl
+
+    await deliver(UpdateDeduplicationMiddleware(), calls)
+    await deliver(UpdateDeduplicationMiddleware(), calls, redelivered=True)
+    assert calls == [UPDATE_ID]
+
+
+async def test_failed_update_is_processed_again(redis: Redis, calls: list[int]) -> None:
+    middleware = UpdateDeduplicationMiddleware()
+
+    with pytest.raises(RuntimeError):
+        await deliver(middleware, calls, fail=True)
+    assert not await redis.exists(mark_key())
+
+    await deliver(middleware, calls)
+    assert calls == [UPDATE_ID, UPDATE_ID]
+
+
+async def test_processing_mark_is_taken_over_only_by_redelivery(
+    redis: Redis, calls: list[int]
+) -> None:
+    # Другой воркер взял апдейт и упал, не закончив обработку
+    await redis.set(mark_key(), PROCESSING, ex=config.dedup.processing_ttl)
+
+    await deliver(UpdateDeduplicationMiddleware(), calls)
+    assert calls == []
+
+    await deliver(UpdateDeduplicationMiddleware(), calls, redelivered=True)
+    assert calls == [UPDATE_ID]
+    assert await redis.get(mark_key()) == DONE
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import DeleteMessages
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from bot.services import deletion
+from settings import config
+
+
+class FakeBot:
+    """deleteMessages: сначала флуд-контроль flood раз, затем ошибка bad_batch или успех"""
+
+    def __init__(self, flood: int = 0, bad_batch: bool = False, flood_single: int = 0) -> None:
+        self.flood = flood
+        self.bad_batch = bad_batch
+        self.flood_single = flood_single
+        self.batches: list[list[int]] = []
+        self.singles: list[int] = []
+
+    @staticmethod
+    def error(cls: Any) -> Exception:
+        method = DeleteMessages(chat_id=-100, message_ids=[1])
+        if cls is TelegramRetryAfter:
+            return TelegramRetryAfter(method=method, message="flood", retry_after=0)
+        return TelegramBadRequest(method=method, message="message can't be deleted")
+
+    async def delete_messages(self, chat_id: int, message_ids: list[int]) -> bool:
+        self.batches.append(message_ids)
+        if self.flood:
+            self.flood -= 1
+            raise self.error(TelegramRetryAfter)
+        if self.bad_batch:
+            raise self.error(TelegramBadRequest)
+        return True
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        self.singles.append(message_id)
+        if message_id == self.flood_single:
+            self.flood_single = 0
+            raise self.error(TelegramRetryAfter)
+        return True
+
+
+@pytest.fixture
+def fake_bot(monkeypatch: pytest.MonkeyPatch) -> FakeBot:
+    monkeypatch.setattr(config.deletion, "window", 0)
+    fake = FakeBot()
+    monkeypatch.setattr(deletion, "bot", fake)
+    return fake
+
+
+async def test_flood_postpones_batch_instead_of_single_deletes(
+    redis: Redis, fake_bot: FakeBot
+) -> None:
+    fake_bot.flood = 1
+
+    await deletion.DeletionCoalescer()._delete(-100, [1, 2, 3])
+
+    assert fake_bot.singles == []
+    assert set(await redis.zrange(deletion.SCHEDULE_KEY, 0, -1)) == {
+        b"-100:1",
+        b"-100:2",
+        b"-100:3",
+    }
+
+
+async def test_flood_during_single_deletes_postpones_the_rest(
+    redis: Redis, fake_bot: FakeBot
+) -> None:
+    fake_bot.bad_batch = True
+    fake_bot.flood_single = 2
+
+    await deletion.DeletionCoalescer()._delete(-100, [1, 2, 3])
+
+    assert fake_bot.singles == [1, 2]
+    assert set(await redis.zrange(deletion.SCHEDULE_KEY, 0, -1)) == {b"-100:2", b"-100:3"}
+
+
+async def test_postponed_delete_is_retried_in_process_without_redis(
+    fake_bot: FakeBot, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def zadd(*args: Any, **kwargs: Any) -> None:
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(deletion.rd, "zadd", zadd)
+    fake_bot.flood = 1
+    coalescer = deletion.DeletionCoalescer()
+
+    await coalescer._delete(-100, [1, 2])
+    while coalescer._tasks:
+        await asyncio.gather(*coalescer._tasks)
+
+    assert fake_bot.batches == [[1, 2], [1, 2]]
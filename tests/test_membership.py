@@ -0,0 +1,34 @@
+import pytest
+from redis.asyncio import Redis
+
+from bot.services import membership
+from settings import config
+
+
+async def test_index_answers_before_cache_and_expires(redis: Redis) -> None:
+    await membership.cache_membership(chat_id=-100, user_id=1, subscribed=False)
+    await membership.track_membership(chat_id=-100, user_id=1, subscribed=True)
+
+    assert await membership.get_cached_memberships([-100], user_id=1) == {-100: True}
+    ttl = await redis.ttl(membership._index_key(-100))
+    assert config.membership_cache.positive_ttl <= ttl <= config.membership_cache.index_ttl
+
+
+async def test_oversized_index_is_dropped(redis: Redis, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.membership_cache, "index_max_size", 2)
+
+    for user_id in range(3):
+        await membership.track_membership(chat_id=-100, user_id=user_id, subscribed=True)
+
+    assert not await redis.exists(membership._index_key(-100))
+    assert await membership.get_cached_memberships([-100], user_id=0) == {-100: None}
+
+
+async def test_index_is_not_written_when_cache_is_off(
+    redis: Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.membership_cache, "turned_on", False)
+
+    await membership.track_membership(chat_id=-100, user_id=1, subscribed=True)
+
+    assert not await redis.exists(membership._index_key(-100))
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetChatMember, Response, SendMessage
+
+from bot.bot import bot
+from bot.services.outbound import (
+    OutboundDropped,
+    OutboundScheduler,
+    Priority,
+    PriorityLimiter,
+    TokenBucket,
+)
+from settings import config
+
+
+def test_bucket_gives_capacity_then_asks_to_wait() -> None:
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == 0
+    assert 0 < bucket.try_take() <= 0.1
+
+
+def test_blocked_bucket_waits_until_unblocked() -> None:
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.block(5)
+
+    assert 4.9 < bucket.try_take() <= 5
+    assert not bucket.idle
+
+
+async def test_limiter_serves_higher_priority_first() -> None:
+    limiter = PriorityLimiter(TokenBucket(rate=100, capacity=1))
+    await limiter.acquire(Priority.BACKGROUND)
+    served: list[Priority] = []
+
+    async def acquire(priority: Priority) -> None:
+        await limiter.acquire(priority)
+        served.append(priority)
+
+    waiters = [
+        asyncio.create_task(acquire(priority))
+        for priority in (Priority.BACKGROUND, Priority.WARNING, Priority.MODERATION)
+    ]
+    await asyncio.gather(*waiters)
+
+    assert served == [Priority.MODERATION, Priority.WARNING, Priority.BACKGROUND]
+
+
+class FakeRequest:
+    def __init__(self, failures: int = 0) -> None:
+        self.calls = 0
+        self.failures = failures
+
+    async def __call__(self, bot: Any, method: Any) -> Response[Any]:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TelegramRetryAfter(method=method, message="flood", retry_after=0)
+        return Response[Any](ok=True, result=True)
+
+
+async def test_group_message_is_dropped_past_chat_wait(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.outbound, "chat_rate_per_minute", 1)
+    monkeypatch.setattr(config.outbound, "max_chat_wait", 0.5)
+    scheduler, request = OutboundScheduler(), FakeRequest()
+    warning = SendMessage(chat_id=-100, text="warning")
+
+    await scheduler(request, bot, warning)
+    with pytest.raises(OutboundDropped):
+        await scheduler(request, bot, warning)
+
+    # Другие группы и личные сообщения не ждут шумную группу
+    await scheduler(request, bot, SendMessage(chat_id=-200, text="warning"))
+    await scheduler(request, bot, GetChatMember(chat_id=-100, user_id=1))
+    assert request.calls == 3
+
+
+async def test_group_message_waits_within_chat_wait(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.outbound, "global_rate", 1000)
+    monkeypatch.setattr(config.outbound, "chat_rate_per_minute", 120)
+    scheduler, request = OutboundScheduler(), FakeRequest()
+    warning = SendMessage(chat_id=-100, text="warning")
+
+    # Сверх емкости лимита группы следующее сообщение ждет полсекунды
+    for _ in range(121):
+        await scheduler(request, bot, warning)
+
+    assert request.calls == 121
+
+
+async def test_retry_after_is_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.outbound, "max_retries", 2)
+    scheduler = OutboundScheduler()
+
+    request = FakeRequest(failures=2)
+    await scheduler(request, bot, GetChatMember(chat_id=-100, user_id=1))
+    assert request.calls == 3
+
+    with pytest.raises(TelegramRetryAfter):
+        await scheduler(FakeRequest(failures=3), bot, GetChatMember(chat_id=-100, user_id=1))
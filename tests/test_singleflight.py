@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiogram.methods import GetChatMember, Response
+
+from bot.bot import bot
+from bot.services.outbound import Priority, get_priority, outbound_priority
+from bot.services.singleflight import SingleFlight
+
+
+class FakeRequest:
+    """make_request, который отвечает, когда тест откроет release"""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.calls: list[Priority] = []
+        self.error: Exception | None = None
+
+    async def __call__(self, bot: Any, method: GetChatMember) -> Response[Any]:
+        self.calls.append(get_priority(method))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return Response[Any](ok=True, result=method.user_id)
+
+
+def get_member(user_id: int = 1) -> GetChatMember:
+    return GetChatMember(chat_id=-100, user_id=user_id)
+
+
+async def test_same_requests_are_coalesced() -> None:
+    middleware, request = SingleFlight(), FakeRequest()
+
+    waiters = [
+        asyncio.create_task(middleware(request, bot, get_member())),
+        asyncio.create_task(middleware(request, bot, get_member())),
+        asyncio.create_task(middleware(request, bot, get_member(user_id=2))),
+    ]
+    await asyncio.sleep(0)
+    request.release.set()
+    responses = await asyncio.gather(*waiters)
+
+    assert [response.result for response in responses] == [1, 1, 2]
+    assert len(request.calls) == 2
+
+
+async def test_request_does_not_inherit_priority_of_first_caller() -> None:
+    middleware, request = SingleFlight(), FakeRequest()
+
+    with outbound_priority(Priority.BACKGROUND):
+        background = asyncio.create_task(middleware(request, bot, get_member()))
+    await asyncio.sleep(0)
+    handler = asyncio.create_task(middleware(request, bot, get_member()))
+    await asyncio.sleep(0)
+    request.release.set()
+    await asyncio.gather(background, handler)
+
+    assert request.calls == [Priority.MEMBERSHIP]
+
+
+async def test_cancelled_waiter_does_not_cancel_request() -> None:
+    middleware, request = SingleFlight(), FakeRequest()
+
+    first = asyncio.create_task(middleware(request, bot, get_member()))
+    second = asyncio.create_task(middleware(request, bot, get_member()))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    request.release.set()
+
+    assert (await second).result == 1
+    assert first.cancelled()
+
+
+async def test_error_reaches_every_waiter() -> None:
+    middleware, request = SingleFlight(), FakeRequest()
+    request.error = RuntimeError("telegram is down")
+
+    waiters = [asyncio.create_task(middleware(request, bot, get_member())) for _ in range(2)]
+    await asyncio.sleep(0)
+    request.release.set()
+
+    for waiter in waiters:
+        with pytest.raises(RuntimeError):
+            await waiter
+    assert len(request.calls) == 1
@@ -0,0 +1,87 @@
+import pytest
+from redis.asyncio import Redis
+
+from bot.services import user_status
+from bot.services.user_status import BLOCKED_MARKER, UserStatusCache, store_status
+from db import Session
+from db.models import User
+from settings import config
+
+# Из диапазона conftest.TEST_CHAT_IDS, который фикстура db очищает
+BLOCKED, UNBLOCKED, STALE = 9_000_000_000, 9_000_000_001, 9_000_000_002
+
+
+@pytest.fixture
+def set_storage(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.auth_cache, "storage", "set")
+
+
+async def add_users(*statuses: tuple[int, bool]) -> None:
+    async with Session() as session, session.begin():
+        session.add_all(User(chat_id=chat_id, status=status) for chat_id, status in statuses)
+
+
+async def blocked_members(redis: Redis) -> set[int]:
+    members = await redis.smembers(config.auth_cache.blocked_key)
+    return {int(member) for member in members}
+
+
+async def test_warm_up_replaces_stale_set(redis: Redis, db: None, set_storage: None) -> None:
+    await add_users((BLOCKED, False), (UNBLOCKED, True))
+    # Множество без маркера: UNBLOCKED разблокировали, пока оно было неполным
+    await redis.sadd(config.auth_cache.blocked_key, UNBLOCKED, STALE)
+
+    await UserStatusCache().warm_up()
+
+    members = await blocked_members(redis)
+    assert BLOCKED in members and int(BLOCKED_MARKER) in members
+    assert UNBLOCKED not in members and STALE not in members
+    assert not await redis.exists(user_status._building_key())
+
+
+async def test_warm_up_skips_complete_set(redis: Redis, db: None, set_storage: None) -> None:
+    await add_users((BLOCKED, False))
+    await redis.sadd(config.auth_cache.blocked_key, BLOCKED_MARKER)
+
+    await UserStatusCache().warm_up()
+
+    assert await blocked_members(redis) == {int(BLOCKED_MARKER)}
+
+
+async def test_status_change_during_rebuild_is_kept(redis: Redis, set_storage: None) -> None:
+    await redis.sadd(config.auth_cache.blocked_key, BLOCKED_MARKER, BLOCKED)
+    await redis.sadd(user_status._building_key(), BLOCKED_MARKER, BLOCKED)
+
+    await store_status(BLOCKED, True, user_id=1, username=None)
+    await store_status(UNBLOCKED, False, user_id=2, username=None)
+
+    for key in (config.auth_cache.blocked_key, user_status._building_key()):
+        assert await redis.smembers(key) == {BLOCKED_MARKER.encode(), str(UNBLOCKED).encode()}
+
+
+async def test_hash_storage_keeps_migrated_set_current(redis: Redis) -> None:
+    await store_status(BLOCKED, False, user_id=1, username="user")
+    # До переноса множества нет и формат hash его не создает
+    assert not await redis.exists(config.auth_cache.blocked_key)
+
+    await redis.sadd(config.auth_cache.blocked_key, BLOCKED_MARKER)
+    await store_status(BLOCKED, False, user_id=1, username="user")
+    await UserStatusCache().set_status(UNBLOCKED, False)
+    await UserStatusCache().set_status(BLOCKED, True)
+
+    assert await blocked_members(redis) == {int(BLOCKED_MARKER), UNBLOCKED}
+    assert await redis.hget(user_status._user_key(BLOCKED), "status") == b"True"
+
+
+async def test_migration_builds_set_from_db(redis: Redis, db: None) -> None:
+    await add_users((BLOCKED, False), (UNBLOCKED, True))
+    await store_status(UNBLOCKED, True, user_id=2, username="user")
+    await redis.sadd(config.auth_cache.blocked_key, STALE)
+
+    report = await user_status.migrate_hashes_to_set(batch=10, delete=True)
+
+    members = await blocked_members(redis)
+    assert BLOCKED in members and int(BLOCKED_MARKER) in members
+    assert STALE not in members and UNBLOCKED not in members
+    assert report["hashes"] == 1
+    assert not await redis.exists(user_status._user_key(UNBLOCKED))
@@ -0,0 +1,48 @@
+from db import Session
+from db.manager import DBManager
+from db.models import User
+
+# Префикс отделяет тестовых пользователей от остальных данных локальной БД
+PREFIX = "keyset_test_"
+
+
+async def add_users(*usernames: str) -> list[int]:
+    async with Session() as session, session.begin():
+        users = [
+            User(chat_id=9_000_000_000 + i, username=username, status=True)
+            for i, username in enumerate(usernames)
+        ]
+        session.add_all(users)
+        await session.flush()
+        return [user.id for user in users]
+
+
+async def get_page(username_prefix: str = PREFIX, **kwargs: int) -> list[int]:
+    async with Session() as session:
+        users = await DBManager(session).get_users_page(username_prefix=username_prefix, **kwargs)
+    return [user.id for user in users]
+
+
+async def test_pages_forward_and_backward(db: None) -> None:
+    ids = await add_users(*(f"{PREFIX}{i}" for i in range(7)))
+
+    assert await get_page(limit=3) == ids[:3]
+    assert await get_page(after_id=ids[2], limit=3) == ids[3:6]
+    assert await get_page(after_id=ids[5], limit=3) == ids[6:]
+    assert await get_page(before_id=ids[6], limit=3) == ids[3:6]
+
+
+async def test_short_backward_page_is_refilled(db: None) -> None:
+    ids = await add_users(*(f"{PREFIX}{i}" for i in range(5)))
+
+    # Перед ids[1] только один пользователь, остальное добирается начиная с курсора
+    assert await get_page(before_id=ids[1], limit=3) == ids[:3]
+    assert await get_page(before_id=ids[0], limit=10) == ids
+
+
+async def test_prefix_is_literal_and_case_insensitive(db: None) -> None:
+    ids = await add_users(f"{PREFIX}A_b", f"{PREFIX}axb", f"{PREFIX}a%c", "other")
+
+    assert await get_page(username_prefix=f"{PREFIX}a_") == ids[:1]
+    assert await get_page(username_prefix=f"{PREFIX}A%") == ids[2:3]
+    assert await get_page(username_prefix=f"{PREFIX}A") == ids[:3]